@@ -0,0 +1,161 @@
+# api.py
+# Prices, EMAs and crossover signals as data, for services that need the
+# numbers behind the chart rather than the chart itself. Everything comes
+# from the same price cache, bar store and crossover engine as update_graph,
+# so the API and the chart always agree.
+#
+# Tables are sent as column-oriented JSON, streamed CSV or Arrow IPC (with
+# the optional pyarrow package). Responses carry an ETag derived from the
+# data version of the ticker, so unchanged data is answered with a 304.
+import hashlib
+import json
+
+import numpy as np
+
+import bar_store
+import indicators
+import price_cache
+
+FORMATS = {
+    'json': 'application/json',
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+INTERVALS = ('1d',) + tuple(bar_store.INTERVALS)
+
+# Rows per chunk of a streamed CSV response
+CSV_CHUNK_ROWS = 5000
+
+# Data is cached by clients for this long after the market has settled
+CLOSED_MAX_AGE = 3600
+
+
+def negotiate(format, accept):
+    """Response format from the `format` query parameter, else the Accept header; None if unsupported."""
+    if format:
+        return format if format in FORMATS else None
+    for part in (accept or '').split(','):
+        media_type = part.split(';')[0].strip()
+        for name, candidate in FORMATS.items():
+            if media_type == candidate:
+                return name
+    return 'json'
+
+
+def validate(period, interval, *windows):
+    """Raise ValueError for a period or EMA window the data functions below would choke on."""
+    # The bar store also serves everything it has for 'max'
+    if not (interval != '1d' and period == 'max'):
+        price_cache.check_period(period)
+    indicators.check_windows(*windows)
+
+
+def refresh(ticker, interval):
+    """Bring the bars of `ticker` up to date; returns their data version (0 if there are none)."""
+    if interval == '1d':
+        return price_cache.refresh(ticker, interval='1d')
+    return bar_store.refresh(ticker, bar_store.INTERVALS[interval][0])
+
+
+def _history(ticker, period, interval):
+    # Called after refresh(); the daily series is read as is rather than refreshed again
+    if interval == '1d':
+        return price_cache.snapshot(ticker, period, interval='1d')[0]
+    return bar_store.get_history(ticker, period, interval)
+
+
+def etag(*parts):
+    return '"' + hashlib.sha1(repr(parts).encode()).hexdigest() + '"'
+
+
+def not_modified(if_none_match, tag):
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip().removeprefix('W/') for candidate in if_none_match.split(',')}
+    return '*' in candidates or tag in candidates
+
+
+def max_age():
+    # New bars can come in at any time while the market is open
+    return price_cache.INTRADAY_TTL if price_cache.market_open() else CLOSED_MAX_AGE
+
+
+def prices(ticker, period, interval):
+    """OHLCV, dividends and splits of `ticker` as a dict of equally long columns."""
+    df = _history(ticker, period, interval)
+    return {
+        'date': df.index,
+        'open': df['Open'].to_numpy(),
+        'high': df['High'].to_numpy(),
+        'low': df['Low'].to_numpy(),
+        'close': df['Close'].to_numpy(),
+        'volume': df['Volume'].to_numpy(),
+        'dividends': df['Dividends'].to_numpy(),
+        'stock_splits': df['Stock Splits'].to_numpy(),
+    }
+
+
+def ema(ticker, period, interval, short_window, long_window):
+    """Close, short and long EMAs and crossover positions (1 buy, -1 sell), as in update_graph."""
+    df = _history(ticker, period, interval)
+    crossover = indicators.engine.compute((ticker, interval), df['Close'], short_window, long_window)
+    return {
+        'date': df.index,
+        'close': df['Close'].to_numpy(),
+        f'ema_{short_window}': np.nan_to_num(crossover.short),
+        f'ema_{long_window}': np.nan_to_num(crossover.long),
+        'position': np.nan_to_num(crossover.position),
+    }
+
+
+def signal(ticker, period, interval, short_window, long_window):
+    """Current Buy/Sell/Hold suggestion of the chart, with the crossing it comes from."""
+    df = _history(ticker, period, interval)
+    crossover = indicators.engine.compute((ticker, interval), df['Close'], short_window, long_window)
+    crossings = np.flatnonzero(np.nan_to_num(crossover.position))
+    return {
+        'ticker': ticker,
+        'interval': interval,
+        'period': period,
+        'short_window': short_window,
+        'long_window': long_window,
+        'suggestion': indicators.suggestion(crossover.last_position),
+        'since': df.index[crossings[-1]].isoformat() if len(crossings) else None,
+        'close': float(df['Close'].iloc[-1]) if len(df) else None,
+        'as_of': df.index[-1].isoformat() if len(df) else None,
+    }
+
+
+def _dates(index):
+    return [stamp.isoformat() for stamp in index]
+
+
+def to_json(columns, **meta):
+    body = {name: _dates(values) if name == 'date' else values.tolist() for name, values in columns.items()}
+    return json.dumps(dict(meta, rows=len(columns['date']), columns=body), separators=(',', ':')).encode()
+
+
+def iter_csv(columns):
+    # Header, then CSV_CHUNK_ROWS rows at a time so large tables start arriving right away
+    names = list(columns)
+    yield ','.join(names) + '\n'
+    rows = len(columns['date'])
+    for start in range(0, rows, CSV_CHUNK_ROWS):
+        end = min(start + CSV_CHUNK_ROWS, rows)
+        chunk = [_dates(columns['date'][start:end])]
+        chunk += [values[start:end].tolist() for name, values in columns.items() if name != 'date']
+        yield ''.join(','.join(map(str, row)) + '\n' for row in zip(*chunk))
+
+
+def to_arrow(columns, **meta):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise RuntimeError('Arrow output requires the pyarrow package')
+    table = pa.table({name: pa.array(values) for name, values in columns.items()},
+                     metadata={key: str(value) for key, value in meta.items()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,63 @@
+// assets/live.js
+// Live mode of the chart. One EventSource per chart receives the completed
+// bars pushed by /live/stream; the live-interval clientside callback drains
+// them into the graph with extendData, so the figure is never sent again.
+//
+// Trace order is the one update_graph builds: candlestick, closing price,
+// short EMA, long EMA, buy markers, sell markers, then the lines of the
+// selected indicator, if any.
+window.stocksLive = {source: null, key: null, buffer: []};
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    live: {
+        drain: function (n_intervals, enabled, figure) {
+            const live = window.stocksLive;
+            const meta = figure && figure.layout && figure.layout.meta;
+            const on = enabled && enabled.length && meta && meta.ticker;
+            // A new figure (or live mode switched off) ends the current stream
+            const key = on ? [meta.ticker, meta.interval, meta.first_ts, meta.last_ts, meta.short, meta.long, meta.source].join('|') : null;
+            if (key !== live.key) {
+                if (live.source) {
+                    live.source.close();
+                }
+                live.source = null;
+                live.buffer = [];
+                live.key = key;
+                if (key) {
+                    const params = new URLSearchParams({
+                        ticker: meta.ticker, interval: meta.interval, first_ts: meta.first_ts,
+                        since: meta.last_ts, short: meta.short, long: meta.long, source: meta.source || 'ema',
+                    });
+                    live.source = new EventSource('/live/stream?' + params);
+                    live.source.addEventListener('bars', function (e) {
+                        live.buffer.push(JSON.parse(e.data));
+                    });
+                }
+            }
+            if (!live.buffer.length) {
+                return window.dash_clientside.no_update;
+            }
+
+            const events = live.buffer.splice(0);
+            const cat = function (name) {
+                return [].concat.apply([], events.map(function (event) { return event[name]; }));
+            };
+            const x = cat('x');
+            const extra = (events[0].indicators || []).map(function (_, k) {
+                return [].concat.apply([], events.map(function (event) { return event.indicators[k]; }));
+            });
+            const xs = extra.map(function () { return x; });
+            const empty = extra.map(function () { return []; });
+            const traces = [0, 1, 2, 3, 4, 5].concat(extra.map(function (_, k) { return 6 + k; }));
+            // extendTraces needs every key for every trace; the ones a trace does not use are empty
+            return [{
+                x: [x, x, x, x, cat('buy_x'), cat('sell_x')].concat(xs),
+                open: [cat('open'), [], [], [], [], []].concat(empty),
+                high: [cat('high'), [], [], [], [], []].concat(empty),
+                low: [cat('low'), [], [], [], [], []].concat(empty),
+                close: [cat('close'), [], [], [], [], []].concat(empty),
+                y: [[], cat('close'), cat('short'), cat('long'), cat('buy_y'), cat('sell_y')].concat(extra),
+            }, traces];
+        }
+    }
+});
@@ -0,0 +1,172 @@
+# backtest.py
+# Parameter sweep of the dual-EMA crossover strategy over a grid of
+# (short, long) spans, using the same signal definition as update_graph:
+# long while the rounded short EMA is above the rounded long EMA, flat otherwise.
+# The other signal sources of technicals.py are swept over a grid of two of
+# their parameters the same way.
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+import indicators
+import technicals
+
+# Pairs evaluated per array operation; bounds the (bars x pairs) temporaries
+CHUNK_SIZE = 256
+
+# Grids with more pairs than this are spread over a process pool
+PROCESS_THRESHOLD = 10000
+
+# Largest (short x long) grid one sweep evaluates
+MAX_PAIRS = 250000
+
+
+# Parameters swept per signal source (rows, columns) and the values tried
+GRIDS = {
+    'rsi': {'period': range(2, 31, 2), 'band': range(10, 45, 5)},
+    'macd': {'fast': range(4, 21, 2), 'slow': range(10, 51, 5)},
+    'bollinger': {'period': range(5, 51, 5), 'width': [1.0, 1.5, 2.0, 2.5, 3.0]},
+    'atr': {'period': range(5, 31, 5), 'multiple': [0.5, 1.0, 1.5, 2.0, 2.5, 3.0]},
+    'vwap': {},
+}
+
+
+def _performance(closes, signal):
+    # (total return, max drawdown, trades) of every long/flat signal column
+    trades = np.count_nonzero(np.diff(signal, axis=0), axis=0)
+
+    # A crossover is acted on at that bar's close, so it earns the next bar's return
+    returns = closes[1:] / closes[:-1] - 1.0
+    equity = np.cumprod(1.0 + signal[:-1] * returns[:, None], axis=0)
+    drawdown = (equity / np.maximum.accumulate(equity, axis=0) - 1.0).min(axis=0)
+    return equity[-1] - 1.0, drawdown, trades
+
+
+def _evaluate(closes, emas, short_idx, long_idx):
+    # (total return, max drawdown, trades) of every (short, long) column pair
+    return _performance(closes, emas[:, short_idx] > emas[:, long_idx])
+
+
+def _evaluate_chunks(closes, emas, short_idx, long_idx):
+    results = [
+        _evaluate(closes, emas, short_idx[i:i + CHUNK_SIZE], long_idx[i:i + CHUNK_SIZE])
+        for i in range(0, len(short_idx), CHUNK_SIZE)
+    ]
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+def sweep(close, short_spans, long_spans, workers=None):
+    """Backtest every (short, long) pair with short < long over the `close` series.
+
+    Returns a dict with the span axes and (short x long) grids of total
+    return, max drawdown and trade count; cells with short >= long are None.
+    Raises ValueError for a grid of more than MAX_PAIRS cells.
+    """
+    if len(short_spans) * len(long_spans) > MAX_PAIRS:
+        raise ValueError(f'At most {MAX_PAIRS} (short, long) pairs can be backtested at once')
+    closes = close.to_numpy(dtype='float64')
+    short_spans = sorted(set(short_spans))
+    long_spans = sorted(set(long_spans))
+    if not short_spans or not long_spans:
+        raise ValueError('Give at least one short and one long span')
+    indicators.check_windows(short_spans[0], long_spans[0])
+    if len(closes) < 2:
+        raise ValueError('Not enough price history to backtest')
+
+    # One EMA column per distinct span, computed together
+    spans = np.array(sorted(set(short_spans) | set(long_spans)), dtype='float64')
+    emas = indicators.ema_matrix(np.repeat(closes[:, None], len(spans), axis=1), spans).round(2)
+
+    pairs = [(i, j) for i, s in enumerate(short_spans) for j, l in enumerate(long_spans) if s < l]
+    column = {span: k for k, span in enumerate(spans.tolist())}
+    short_idx = np.array([column[short_spans[i]] for i, _ in pairs], dtype='intp')
+    long_idx = np.array([column[long_spans[j]] for _, j in pairs], dtype='intp')
+
+    if len(pairs) > PROCESS_THRESHOLD and (workers or os.cpu_count() or 1) > 1:
+        workers = workers or os.cpu_count()
+        bounds = np.linspace(0, len(pairs), workers + 1).astype(int)
+        # Spawned, not forked: the server calls this from a worker thread while other threads run
+        with ProcessPoolExecutor(workers, mp_context=get_context('spawn')) as pool:
+            parts = list(pool.map(_evaluate_chunks, [closes] * workers, [emas] * workers,
+                                  [short_idx[a:b] for a, b in zip(bounds, bounds[1:])],
+                                  [long_idx[a:b] for a, b in zip(bounds, bounds[1:])]))
+        total, drawdown, trades = (np.concatenate(p) for p in zip(*parts))
+    else:
+        total, drawdown, trades = _evaluate_chunks(closes, emas, short_idx, long_idx)
+
+    grids = {name: [[None] * len(long_spans) for _ in short_spans] for name in ('total_return', 'max_drawdown', 'trades')}
+    for k, (i, j) in enumerate(pairs):
+        grids['total_return'][i][j] = round(float(total[k]), 4)
+        grids['max_drawdown'][i][j] = round(float(drawdown[k]), 4)
+        grids['trades'][i][j] = int(trades[k])
+
+    return {
+        'short': short_spans,
+        'long': long_spans,
+        'buy_and_hold': round(float(closes[-1] / closes[0] - 1.0), 4),
+        **grids,
+    }
+
+
+def sweep_indicator(df, source, grid=None, intraday=False):
+    """Backtest the `source` signal rule of technicals.py for every parameter pair of `grid`.
+
+    `grid` maps at most two parameters of the indicator to the values
+    tried (GRIDS[source] by default). Returns the axes and (rows x columns)
+    grids of total return, max drawdown and trade count like sweep;
+    parameter pairs the indicator rejects are None.
+    """
+    if source not in technicals.DEFAULTS:
+        raise ValueError(f'Unknown signal source: {source}')
+    grid = GRIDS[source] if grid is None else grid
+    if len(grid) > 2:
+        raise ValueError('At most two parameters can be swept')
+    closes = df['Close'].to_numpy(dtype='float64')
+    if len(closes) < 2:
+        raise ValueError('Not enough price history to backtest')
+
+    names = list(grid)
+    axes = [list(values) for values in grid.values()]
+    session_start = technicals.session_starts(df.index) if intraday else None
+    rule_params = technicals.RULE_PARAMS.get(source, ())
+    # Indicator columns per setting of the parameters the indicator itself reads;
+    # the rule-only ones (RSI band, ATR multiple) reuse them. None if rejected
+    computed = {}
+    columns, cells = [], []
+    for cell in itertools.product(*(range(len(values)) for values in axes)):
+        params = {source: {name: axes[k][i] for k, (name, i) in enumerate(zip(names, cell))}}
+        key = tuple((name, value) for name, value in params[source].items() if name not in rule_params)
+        if key not in computed:
+            try:
+                computed[key] = technicals.compute(df['High'], df['Low'], df['Close'], df['Volume'], [source],
+                                                   params, session_start=session_start)
+            except ValueError:
+                computed[key] = None
+        if computed[key] is None:
+            continue
+        columns.append(technicals.long_flat(source, closes, computed[key], params))
+        cells.append(cell)
+
+    shape = [len(values) for values in axes] + [1] * (2 - len(axes))
+    grids = {name: [[None] * shape[1] for _ in range(shape[0])] for name in ('total_return', 'max_drawdown', 'trades')}
+    if columns:
+        signals = np.stack(columns, axis=1)
+        results = [_performance(closes, signals[:, i:i + CHUNK_SIZE]) for i in range(0, len(cells), CHUNK_SIZE)]
+        total, drawdown, trades = (np.concatenate(parts) for parts in zip(*results))
+        for k, cell in enumerate(cells):
+            i, j = (tuple(cell) + (0, 0))[:2]
+            grids['total_return'][i][j] = round(float(total[k]), 4)
+            grids['max_drawdown'][i][j] = round(float(drawdown[k]), 4)
+            grids['trades'][i][j] = int(trades[k])
+
+    return {
+        'source': source,
+        'parameters': names,
+        'rows': axes[0] if axes else [None],
+        'columns': axes[1] if len(axes) > 1 else [None],
+        'buy_and_hold': round(float(closes[-1] / closes[0] - 1.0), 4),
+        **grids,
+    }
@@ -0,0 +1,241 @@
+# bar_store.py
+# Columnar, append-only store of intraday bars.
+#
+# Every (ticker, interval) has a directory under STORE_DIR with one file per
+# market day. A day file is a (columns x bars) float64 .npy array (epoch
+# seconds, open, high, low, close, volume), so every column is contiguous and
+# the file is memory-mapped instead of read. Past days are never rewritten;
+# only the latest day grows as new bars come in. Reading a range opens just
+# the day files it covers, so a chart of the last few days never touches the
+# rest of the history.
+#
+# Intervals Yahoo serves directly are stored as such; coarser ones are
+# resampled from a finer stored interval (15m from 5m).
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import metrics
+import price_cache
+import providers
+
+STORE_DIR = 'bar-store'
+
+# Intraday intervals offered by the chart: stored interval it is read from,
+# and the history Yahoo keeps for that stored interval
+INTERVALS = {
+    '1m': ('1m', '7d'),
+    '5m': ('5m', '60d'),
+    '15m': ('5m', '60d'),
+    '1h': ('1h', '730d'),
+}
+
+# Longest history Yahoo serves per stored interval
+PERIODS = {stored: period for stored, period in INTERVALS.values()}
+MINUTES = {'1m': 1, '5m': 5, '15m': 15, '1h': 60}
+
+FIELDS = ['ts', 'open', 'high', 'low', 'close', 'volume']
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+_key_locks = {}
+_key_locks_guard = threading.Lock()
+
+
+def _key_lock(key):
+    with _key_locks_guard:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def _dir(ticker, interval):
+    return os.path.join(STORE_DIR, ticker, interval)
+
+
+def _meta_path(ticker, interval):
+    return os.path.join(_dir(ticker, interval), 'meta.json')
+
+
+def _read_meta(ticker, interval):
+    try:
+        with open(_meta_path(ticker, interval)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _atomic_write(path, write):
+    # Readers in other workers only ever see a complete file
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as file:
+        write(file)
+    os.replace(tmp_path, path)
+
+
+def days(ticker, interval):
+    """Stored market days of (ticker, interval) as 'YYYYMMDD' strings, oldest first."""
+    try:
+        names = os.listdir(_dir(ticker, interval))
+    except OSError:
+        return []
+    return sorted(name[:-4] for name in names if name.endswith('.npy'))
+
+
+def _day_path(ticker, interval, day):
+    return os.path.join(_dir(ticker, interval), f'{day}.npy')
+
+
+def _load_day(ticker, interval, day):
+    return np.load(_day_path(ticker, interval, day), mmap_mode='r')
+
+
+def append(ticker, interval, df):
+    """Add the bars of `df` to the store; bars of days before the latest stored day are ignored.
+
+    Returns the number of days written.
+    """
+    if df.empty:
+        return 0
+    os.makedirs(_dir(ticker, interval), exist_ok=True)
+    stored = days(ticker, interval)
+    latest = stored[-1] if stored else ''
+
+    stamps = (df.index.as_unit('s').asi8).astype('float64')
+    values = df.reindex(columns=COLUMNS).to_numpy(dtype='float64', na_value=0.0)
+    table = np.column_stack([stamps, values]).T
+    day_of_bar = df.index.strftime('%Y%m%d').to_numpy()
+    starts = np.flatnonzero(np.concatenate([[True], day_of_bar[1:] != day_of_bar[:-1]]))
+    written = 0
+    for start, end in zip(starts, np.append(starts[1:], len(df))):
+        day = day_of_bar[start]
+        if day < latest:
+            continue
+        new = table[:, start:end]
+        if day == latest:
+            # Keep the stored bars before the first new one; the last stored bar may have been partial
+            old = np.asarray(_load_day(ticker, interval, day))
+            new = np.concatenate([old[:, old[0] < new[0, 0]], new], axis=1)
+        _atomic_write(_day_path(ticker, interval, day), lambda file, new=new: np.save(file, new))
+        written += 1
+    return written
+
+
+def refresh(ticker, interval, ttl=price_cache.INTRADAY_TTL):
+    """Bring the stored `interval` bars of `ticker` up to date; returns the store version (0 if none).
+
+    During market hours, bars fetched less than `ttl` seconds ago (by any
+    worker) count as up to date.
+    """
+    ticker = ticker.upper()
+    with _key_lock((ticker, interval)):
+        meta = _read_meta(ticker, interval)
+        if meta is not None and price_cache.is_fresh(meta['fetched_at'], ttl=ttl):
+            return meta['version']
+
+        now = time.time()
+        stored = days(ticker, interval)
+        with metrics.stage('price_fetch'):
+            if stored:
+                # Refetch the latest stored day, its last bar may have been partial
+                start = pd.Timestamp(stored[-1]).date()
+                df = providers.price_provider().history(ticker, interval, start=start)
+            else:
+                df = providers.price_provider().history(ticker, interval, period=PERIODS[interval])
+        if not df.empty:
+            df = df.tz_convert(price_cache.MARKET_TZ)
+        written = append(ticker, interval, df)
+        if meta is None and not written:
+            return 0
+        meta = {'fetched_at': now,
+                'version': (meta['version'] if meta else 0) + (1 if written else 0)}
+        _atomic_write(_meta_path(ticker, interval), lambda file: file.write(json.dumps(meta).encode()))
+        return meta['version']
+
+
+def read(ticker, interval, first_day=None, start=None, end=None):
+    """Stored bars from `first_day` ('YYYYMMDD') on, limited to epoch seconds [start, end).
+
+    Only the day files in range are opened. Returns a (columns x bars) array
+    with the rows of FIELDS.
+    """
+    pieces = []
+    for day in days(ticker, interval):
+        if first_day is not None and day < first_day:
+            continue
+        table = _load_day(ticker, interval, day)
+        lo = np.searchsorted(table[0], start) if start is not None else 0
+        hi = np.searchsorted(table[0], end) if end is not None else table.shape[1]
+        if hi > lo:
+            pieces.append(table[:, lo:hi])
+    if not pieces:
+        return np.empty((len(FIELDS), 0))
+    return np.concatenate(pieces, axis=1)
+
+
+def resample(table, minutes):
+    """Aggregate bars into `minutes`-long bars aligned to the clock in market time.
+
+    First open, max high, min low, last close and summed volume per bar;
+    each output bar is stamped with the start of its period.
+    """
+    if table.shape[1] == 0:
+        return table
+    stamps = table[0].astype('int64')
+    # Bucket on local wall-clock time so 15 minute bars start at :00, :15, :30 and :45
+    local = pd.to_datetime(stamps, unit='s', utc=True).tz_convert(price_cache.MARKET_TZ)
+    local = local.tz_localize(None).as_unit('s').asi8
+    period = minutes * 60
+    buckets = local // period
+    starts = np.flatnonzero(np.concatenate([[True], buckets[1:] != buckets[:-1]]))
+    last = np.append(starts[1:], len(stamps)) - 1
+    return np.vstack([
+        (buckets[starts] * period - (local - stamps)[starts]).astype('float64'),
+        table[1][starts],
+        np.maximum.reduceat(table[2], starts),
+        np.minimum.reduceat(table[3], starts),
+        table[4][last],
+        np.add.reduceat(table[5], starts),
+    ])
+
+
+def to_frame(table):
+    # Same shape as a price_cache frame, so update_graph and the overlays can use it as is
+    index = pd.to_datetime(table[0].astype('int64'), unit='s', utc=True).tz_convert(price_cache.MARKET_TZ)
+    df = pd.DataFrame(dict(zip(COLUMNS, table[1:])), index=pd.DatetimeIndex(index, name='Date'))
+    df['Dividends'] = 0.0
+    df['Stock Splits'] = 0.0
+    return df
+
+
+def _first_day(stored, period):
+    # 'Nd' is the last N market days; months and years are calendar offsets back from the latest day
+    if not stored or period in (None, 'max'):
+        return None
+    if period.endswith('d'):
+        return stored[-int(period[:-1]):][0]
+    latest = pd.Timestamp(stored[-1])
+    if period.endswith('mo'):
+        first = latest - pd.DateOffset(months=int(period[:-2]))
+    elif period.endswith('y'):
+        first = latest - pd.DateOffset(years=int(period[:-1]))
+    else:
+        raise ValueError(f'Unsupported period: {period}')
+    return f'{first + pd.Timedelta(days=1):%Y%m%d}'
+
+
+def get_history(ticker, period, interval):
+    """Intraday counterpart of price_cache.get_history: `period` of `interval` bars of `ticker`."""
+    ticker = ticker.upper()
+    stored_interval, _ = INTERVALS[interval]
+    refresh(ticker, stored_interval)
+    table = read(ticker, stored_interval, _first_day(days(ticker, stored_interval), period))
+    if interval != stored_interval:
+        table = resample(table, MINUTES[interval])
+    return to_frame(table)
+
+
+def data_version(ticker, interval):
+    meta = _read_meta(ticker.upper(), INTERVALS[interval][0])
+    return meta['version'] if meta else 0
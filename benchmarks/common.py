@@ -0,0 +1,75 @@
+# benchmarks/common.py
+# Helpers shared by the benchmark scripts: a scratch working directory with the
+# local data provider, latency percentiles, peak RSS and the JSON result files.
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmarks', 'results')
+
+PERIODS = ['5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y']
+
+
+def offline_env(latency_ms=0):
+    """Environment that makes the app use the local provider in a scratch directory.
+
+    The databases, filings and figure cache of a benchmark run are created in
+    the returned directory, never in the repository.
+    """
+    workdir = tempfile.mkdtemp(prefix='stocks-bench-')
+    env = dict(os.environ,
+               STOCKS_PROVIDER='local',
+               STOCKS_PROVIDER_LATENCY_MS=str(latency_ms),
+               STOCKS_FIXTURE_DIR=os.environ.get('STOCKS_FIXTURE_DIR', os.path.join(REPO_DIR, 'fixtures')),
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])))
+    return workdir, env
+
+
+def percentiles(samples_ms):
+    if not samples_ms:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'mean_ms': None}
+    ordered = sorted(samples_ms)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+    return {'p50_ms': pick(0.50), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99),
+            'mean_ms': round(sum(ordered) / len(ordered), 3)}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def save_results(kind, results, output=None):
+    """Write `results` with run metadata to `output` (default benchmarks/results/) and return the path."""
+    payload = {
+        'kind': kind,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, 'w') as file:
+        json.dump(payload, file, indent=2)
+    return output
@@ -0,0 +1,52 @@
+# benchmarks/compare.py
+# Side-by-side comparison of two result files of the same kind (micro or loadtest):
+#
+#   python benchmarks/compare.py benchmarks/results/micro-before.json benchmarks/results/micro-after.json
+#
+# Prints every latency, throughput and memory figure of both runs with the
+# relative change; for latencies and memory, negative is better.
+import argparse
+import json
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'mean_ms', 'throughput_rps', 'peak_rss_mb',
+           'server_peak_rss_mb', 'client_peak_rss_mb')
+
+
+def flatten(results, prefix=''):
+    # {'10y': {'figure_full': {'p50_ms': 1}}} -> {'10y.figure_full.p50_ms': 1}, for the compared metrics
+    rows = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            rows.update(flatten(value, name + '.'))
+        elif key in METRICS or key.endswith('_bytes'):
+            rows[name] = value
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('before')
+    parser.add_argument('after')
+    args = parser.parse_args()
+
+    with open(args.before) as file:
+        before = json.load(file)
+    with open(args.after) as file:
+        after = json.load(file)
+    if before['kind'] != after['kind']:
+        parser.error(f"cannot compare a {before['kind']} run with a {after['kind']} run")
+
+    print(f"{before['kind']}: {before['commit']} ({before['created']}) -> {after['commit']} ({after['created']})")
+    old, new = flatten(before['results']), flatten(after['results'])
+    width = max(map(len, old), default=0)
+    for name, old_value in old.items():
+        new_value = new.get(name)
+        if old_value is None or new_value is None:
+            continue
+        change = f'{(new_value - old_value) / old_value:+.1%}' if old_value else ''
+        print(f'{name:{width}}  {old_value:>12}  {new_value:>12}  {change:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/importtime.py
+# Import-time budget of main.py, measured with `python -X importtime`.
+#
+#   python benchmarks/importtime.py [--runs 5] [--budget-ms 800] [--output results.json]
+#
+# Reports the median time to import main and its slowest direct imports, and
+# exits with status 1 when the median is over the budget or when main pulls
+# in a library that must only load lazily (see startup.py), so a regression
+# fails the build.
+import argparse
+import statistics
+import subprocess
+import sys
+
+import common
+
+BUDGET_MS = 800
+
+# Libraries main.py must not import at startup
+LAZY = ('dash', 'plotly', 'flask', 'pandas', 'numpy', 'yfinance', 'sec_edgar_downloader', 'numba', 'pyarrow')
+
+
+def parse(stderr):
+    # (name, depth, self us, cumulative us) of every line of -X importtime output
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure(env, cwd):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'],
+                            env=env, cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f'importing main failed:\n{result.stderr[-2000:]}')
+    return parse(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS)
+    parser.add_argument('--top', type=int, default=10, help='slowest direct imports of main to report')
+    parser.add_argument('--output', help='result file (default: benchmarks/results/importtime-<time>.json)')
+    args = parser.parse_args()
+
+    workdir, env = common.offline_env()
+    # The first run writes the bytecode caches; it is not counted
+    measure(env, workdir)
+    runs = [measure(env, workdir) for _ in range(args.runs)]
+
+    totals = [next(cumulative for name, depth, _, cumulative in rows if name == 'main' and depth == 0) / 1000
+              for rows in runs]
+    total_ms = statistics.median(totals)
+    last = runs[-1]
+    imports = sorted(((name, cumulative / 1000) for name, depth, _, cumulative in last if depth == 1),
+                     key=lambda item: item[1], reverse=True)
+    loaded = {name.split('.')[0] for name, *_ in last}
+    eager = sorted(name for name in LAZY if name in loaded)
+
+    print(f'import main: {total_ms:.1f} ms (median of {args.runs}, budget {args.budget_ms:.0f} ms)')
+    for name, ms in imports[:args.top]:
+        print(f'  {ms:8.1f} ms  {name}')
+    if eager:
+        print(f"imported at startup but should load lazily: {', '.join(eager)}")
+
+    path = common.save_results('importtime', {
+        'total_ms': round(total_ms, 1),
+        'runs_ms': [round(total, 1) for total in totals],
+        'budget_ms': args.budget_ms,
+        'imports_ms': {name: round(ms, 1) for name, ms in imports[:args.top]},
+        'eager': eager,
+    }, args.output)
+    print(f'results saved to {path}')
+
+    over = total_ms > args.budget_ms
+    if over:
+        print(f'over budget by {total_ms - args.budget_ms:.1f} ms')
+    sys.exit(1 if over or eager else 0)
+
+
+if __name__ == '__main__':
+    main()
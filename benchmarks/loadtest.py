@@ -0,0 +1,205 @@
+# benchmarks/loadtest.py
+# Concurrent load test of the running app: starts uvicorn with the local data
+# provider in a scratch directory, then hammers /, /10k, /10q and the Dash
+# chart callback (/dash/_dash-update-component) from CONCURRENCY client threads
+# for DURATION seconds. Every client keeps its own session cookie and cycles
+# through the tickers and periods given on the command line.
+#
+#   python benchmarks/loadtest.py [--concurrency 16] [--duration 30] [--workers 1] [--latency-ms 20]
+#
+# Latency percentiles and throughput per endpoint, and the peak RSS of the
+# server processes, are saved as JSON.
+import argparse
+import http.client
+import itertools
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import common
+
+ENDPOINTS = ('/', '/10k', '/10q', '/dash/_dash-update-component')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def chart_request(ticker, period, short, long, mode):
+    # Body of the request the browser sends when "Refresh Visual" is clicked
+    state = [('stock-input', ticker), ('period-dropdown', period), ('short-time-window-input', short),
+             ('long-time-window-input', long), ('render-mode-radio', mode), ('interval-dropdown', '1d'),
+             ('signal-dropdown', 'ema')]
+    return json.dumps({
+        'output': 'stock-graph.figure',
+        'outputs': {'id': 'stock-graph', 'property': 'figure'},
+        'inputs': [{'id': 'refresh-button', 'property': 'n_clicks', 'value': 1}],
+        'changedPropIds': ['refresh-button.n_clicks'],
+        'state': [{'id': id_, 'property': 'value', 'value': value} for id_, value in state],
+    })
+
+
+def _rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as file:
+            for line in file:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _process_tree(pid):
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        try:
+            with open(f'/proc/{current}/task/{current}/children') as file:
+                pending.extend(int(child) for child in file.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+class RSSSampler(threading.Thread):
+    """Largest resident set of a process and its children seen while running (Linux only)."""
+
+    def __init__(self, pid, interval=0.2):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_kb = 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.is_set():
+            self.peak_kb = max(self.peak_kb, sum(_rss_kb(pid) for pid in _process_tree(self.pid)))
+            self._done.wait(self.interval)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        return round(self.peak_kb / 1024, 1) if self.peak_kb else None
+
+
+def wait_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/stats')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server did not start on port {port} within {timeout}s')
+
+
+def client(port, deadline, requests, samples, errors, lock):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    cookie = None
+    for endpoint, body in requests:
+        if time.time() >= deadline:
+            break
+        headers = {'Accept-Encoding': 'gzip'}
+        if cookie:
+            headers['Cookie'] = cookie
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+        start = time.perf_counter()
+        try:
+            conn.request('POST' if body is not None else 'GET', endpoint, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            ok = response.status < 400
+            set_cookie = response.getheader('Set-Cookie')
+            if set_cookie and cookie is None:
+                cookie = set_cookie.split(';', 1)[0]
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            ok = False
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            if ok:
+                samples[endpoint].append(elapsed)
+            else:
+                errors[endpoint] += 1
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30, help='seconds of load')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes')
+    parser.add_argument('--latency-ms', type=float, default=20, help='simulated upstream latency')
+    parser.add_argument('--tickers', nargs='+', default=['AAPL', 'MSFT', 'NVDA', 'AMZN', 'GOOG'])
+    parser.add_argument('--periods', nargs='+', default=common.PERIODS)
+    parser.add_argument('--mode', choices=['compact', 'full'], default='compact')
+    parser.add_argument('--output', help='result file (default: benchmarks/results/loadtest-<time>.json)')
+    args = parser.parse_args()
+
+    workdir, env = common.offline_env(args.latency_ms)
+    port = free_port()
+    server = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1',
+                               '--port', str(port), '--workers', str(args.workers), '--log-level', 'warning'],
+                              cwd=workdir, env=env)
+    try:
+        wait_ready(port)
+        sampler = RSSSampler(server.pid)
+        sampler.start()
+
+        samples, errors, lock = defaultdict(list), defaultdict(int), threading.Lock()
+        started = time.time()
+        deadline = started + args.duration
+        threads = []
+        for n in range(args.concurrency):
+            charts = itertools.cycle([chart_request(ticker, period, 10, 30, args.mode)
+                                      for ticker in args.tickers for period in args.periods])
+            # Each client starts at a different point of the endpoint cycle
+            sequence = itertools.islice(itertools.cycle(ENDPOINTS), n, None)
+            requests = ((endpoint, next(charts) if endpoint.startswith('/dash/') else None) for endpoint in sequence)
+            thread = threading.Thread(target=client, args=(port, deadline, requests, samples, errors, lock))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - started
+        server_rss = sampler.stop()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    endpoints = {
+        endpoint: dict(common.percentiles(samples[endpoint]), requests=len(samples[endpoint]),
+                       errors=errors[endpoint], throughput_rps=round(len(samples[endpoint]) / elapsed, 2))
+        for endpoint in ENDPOINTS
+    }
+    everything = [sample for endpoint in ENDPOINTS for sample in samples[endpoint]]
+    results = {
+        'config': vars(args),
+        'elapsed_s': round(elapsed, 2),
+        'endpoints': endpoints,
+        'total': dict(common.percentiles(everything), requests=len(everything),
+                      errors=sum(errors.values()), throughput_rps=round(len(everything) / elapsed, 2)),
+        'server_peak_rss_mb': server_rss,
+        'client_peak_rss_mb': common.peak_rss_mb(),
+    }
+    for endpoint, row in endpoints.items():
+        print(f"{endpoint:32} {row['requests']:6} req {row['errors']:4} err  p50 {row['p50_ms']} ms  "
+              f"p95 {row['p95_ms']} ms  p99 {row['p99_ms']} ms  {row['throughput_rps']} req/s")
+    print(f'server peak RSS {server_rss} MB')
+    print(f"results saved to {common.save_results('loadtest', results, args.output)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/micro.py
+# Micro-benchmarks of the chart pipeline at every period of the period dropdown:
+# the EMA crossover computation (cold and incremental) and chart figure
+# construction (compact and full rendering, cold and from the figure cache).
+#
+#   python benchmarks/micro.py [--repeat 20] [--ticker AAPL] [--output results.json]
+#
+# Runs offline against the local data provider in a scratch directory.
+import argparse
+import os
+import sys
+import time
+
+import common
+
+
+def timed(func, repeat, warmup=2, before=None):
+    # Wall time of `repeat` calls of func() in milliseconds; before() runs untimed ahead of each call
+    samples = []
+    for i in range(warmup + repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        if i >= warmup:
+            samples.append(elapsed)
+    return common.percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--ticker', default='AAPL')
+    parser.add_argument('--short', type=int, default=10)
+    parser.add_argument('--long', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--periods', nargs='+', default=common.PERIODS)
+    parser.add_argument('--output', help='result file (default: benchmarks/results/micro-<time>.json)')
+    args = parser.parse_args()
+
+    workdir, env = common.offline_env()
+    os.environ.update(env)
+    os.chdir(workdir)
+    sys.path.insert(0, common.REPO_DIR)
+
+    import chart
+    import figure_cache
+    import indicators
+    import price_cache
+
+    ticker = args.ticker.upper()
+    price_cache.refresh(ticker)
+    results = {}
+    for period in args.periods:
+        close = price_cache.get_history(ticker, period)['Close']
+        key = (ticker, '1d')
+        row = {'bars': len(close)}
+
+        row['indicators_cold'] = timed(
+            lambda: indicators.CrossoverEngine().compute(key, close, args.short, args.long), args.repeat)
+
+        # One new bar on top of EMA state that has seen all the others
+        primed = {}
+
+        def prime():
+            primed['engine'] = indicators.CrossoverEngine()
+            primed['engine'].compute(key, close.iloc[:-1], args.short, args.long)
+        row['indicators_incremental'] = timed(
+            lambda: primed['engine'].compute(key, close, args.short, args.long), args.repeat, before=prime)
+
+        for mode in ('compact', 'full'):
+            def render():
+                return chart.build_figure(ticker, period, args.short, args.long, mode)
+            row[f'figure_{mode}'] = timed(render, args.repeat, before=figure_cache.clear)
+            row[f'figure_{mode}_cached'] = timed(render, args.repeat)
+            figure_cache.clear()
+            row[f'figure_{mode}_payload_bytes'] = len(render().to_json())
+
+        results[period] = row
+        print(f"{period:>4} {row['bars']:>5} bars  indicators {row['indicators_cold']['p50_ms']:8.3f} ms  "
+              f"compact {row['figure_compact']['p50_ms']:8.3f} ms  full {row['figure_full']['p50_ms']:8.3f} ms")
+
+    path = common.save_results('micro', {'ticker': ticker, 'short': args.short, 'long': args.long,
+                                         'repeat': args.repeat, 'periods': results,
+                                         'peak_rss_mb': common.peak_rss_mb()}, args.output)
+    print(f'results saved to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,556 @@
+# chart.py
+# The Dash app: the chart page and the portfolio page (/dash/portfolio),
+# their layouts, callbacks and figure construction.
+#
+# This is the module that needs Dash, Plotly and pandas, so main.py only
+# imports it when the first request reaches the Dash mount (or at warm-up,
+# see startup.py); a worker starts serving without loading any of them.
+import re
+import time
+
+import dash
+import flask
+import numpy as np
+import plotly.graph_objects as go
+from dash import dcc, html, Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
+
+import bar_store
+import figure_cache
+import indicators
+import metrics
+import overlays
+import portfolio
+import price_cache
+import rendering
+import sessions
+import storage
+import technicals
+
+# Session of the current Dash request (None outside a request); the FastAPI
+# middleware assigns it and sets the cookie, and a2wsgi passes its scope on
+def dash_session_id():
+    if not flask.has_request_context():
+        return None
+    return flask.request.environ.get('asgi.scope', {}).get(sessions.SCOPE_KEY)
+
+def record_figure_payload(response):
+    if flask.request.path.endswith('_dash-update-component'):
+        rendering.record_payload(response.calculate_content_length() or 0)
+    return response
+
+# Indicators drawn in a pane of their own below the price
+OSCILLATORS = ('rsi', 'macd', 'atr')
+
+# Holdings whose rolling beta the portfolio page draws one line each for
+MAX_BETA_LINES = 10
+
+# The page under the Dash mount is picked from the URL by render_page
+def serve_layout():
+    return html.Div([dcc.Location(id='url'), html.Div(id='page-content')])
+
+def render_page(pathname):
+    if dash.strip_relative_path(pathname or '') == 'portfolio':
+        return portfolio_layout()
+    return chart_layout()
+
+# Define the layout of the chart page; built on every page load from the visitor's session
+def chart_layout():
+    state = sessions.load(dash_session_id())
+    return html.Div([
+        html.Div([
+        # Dropdown for selecting the period
+        html.Label('Time Period:'),
+        dcc.Dropdown(
+            id='period-dropdown',
+            options=[
+                {'label': '5 days', 'value': '5d'},
+                {'label': '1 month', 'value': '1mo'},
+                {'label': '3 months', 'value': '3mo'},
+                {'label': '6 months', 'value': '6mo'},
+                {'label': '1 year', 'value': '1y'},
+                {'label': '2 year', 'value': '2y'},
+                {'label': '5 years', 'value': '5y'},
+                {'label': '10 years', 'value': '10y'},
+            ],
+            value=state['period']  # from the session
+        ),
+
+        # Bar size; intraday bars come from the columnar bar store and cover
+        # as much of the period as Yahoo keeps for that interval
+        html.Label('Interval:'),
+        dcc.Dropdown(
+            id='interval-dropdown',
+            options=[
+                {'label': '1 day', 'value': '1d'},
+                {'label': '1 hour', 'value': '1h'},
+                {'label': '15 minutes', 'value': '15m'},
+                {'label': '5 minutes', 'value': '5m'},
+                {'label': '1 minute', 'value': '1m'},
+            ],
+            value=state['interval']  # from the session
+        ),
+
+        # Input for entering the stock ticker
+        html.Div([
+            html.Label('Stock Ticker:'),
+            dcc.Input(
+                id='stock-input',
+                type='text',
+                value=state['ticker']  # from the session
+            )
+        ]),
+
+        # Input for short time window
+        html.Div([
+            html.Label('Short-Term-EMA:'),
+            dcc.Input(
+                id='short-time-window-input',
+                type='number',
+                value=state['short_window']  # from the session
+            )
+        ]),
+
+        # Input for long time window
+        html.Div([
+            html.Label('Long-Term-EMA:'),
+            dcc.Input(
+                id='long-time-window-input',
+                type='number',
+                value=state['long_window']  # from the session
+            )
+        ]),
+
+        # Indicator whose rule places the buy/sell markers
+        html.Div([
+            html.Label('Signal:'),
+            dcc.Dropdown(
+                id='signal-dropdown',
+                options=[{'label': label, 'value': source} for source, label in technicals.LABELS.items()],
+                value='ema',  # default value
+                clearable=False
+            )
+        ]),
+
+        # Compact rendering buckets long periods down to the plot width
+        html.Div([
+            html.Label('Rendering:'),
+            dcc.RadioItems(
+                id='render-mode-radio',
+                options=[
+                    {'label': 'Compact', 'value': 'compact'},
+                    {'label': 'Full detail', 'value': 'full'},
+                ],
+                value='compact',  # default value
+                inline=True
+            )
+        ]),
+
+        # Button for refreshing the data
+        html.Button('Refresh Visual', id='refresh-button', n_clicks=0),
+
+        # Live mode appends new bars pushed by the server (see assets/live.js)
+        dcc.Checklist(id='live-toggle', options=[{'label': 'Live', 'value': 'live'}], value=[], inline=True),
+        dcc.Interval(id='live-interval', interval=1000, disabled=True),
+        ]),
+        # Here's the loading component wrapping the graph
+        dcc.Loading(
+            id="loading",
+            type="circle",
+            children=[dcc.Graph(id='stock-graph',
+                                figure={
+                                    'layout': {
+                                        'xaxis': {'visible': False},
+                                        'yaxis': {'visible': False},
+                                        'annotations': [{
+                                            'text': 'Chart is loading...',
+                                            'xref': 'paper',
+                                            'yref': 'paper',
+                                            'showarrow': False,
+                                            'font': {'size': 28}
+                                        }]
+                                    }
+                                }
+                            ),
+                ],
+            color="black"
+        ),
+        ])
+
+# Callback for updating the graph when the refresh button is clicked
+def update_graph(n_clicks,stock_symbol,selected_period,short_window, long_window, render_mode='compact', interval='1d',
+                 source='ema'):
+    # If the button hasn't been clicked, do not update the graph
+    if n_clicks is None:
+        raise PreventUpdate
+
+    stock_symbol = stock_symbol.upper()
+    fig = build_figure(stock_symbol, selected_period, short_window, long_window, render_mode, interval, source)
+    remember_chart(stock_symbol, selected_period, short_window, long_window, interval)
+    return fig
+
+def build_figure(stock_symbol, selected_period, short_window, long_window, render_mode='compact', interval='1d',
+                 source='ema'):
+    """Chart figure of `stock_symbol`, from the figure cache while its data has not changed."""
+    render_start = time.perf_counter()
+
+    # Same chart on the same data as a previous request: serve the cached figure.
+    # The price cache version changes with every new bar, which retires old entries.
+    intraday = interval != '1d'
+    with metrics.stage('price_refresh'):
+        if intraday:
+            data_version = bar_store.refresh(stock_symbol, bar_store.INTERVALS[interval][0])
+        else:
+            data_version = price_cache.refresh(stock_symbol, interval='1d')
+    figure_key = (stock_symbol, selected_period, short_window, long_window, render_mode, data_version, interval, source)
+    with metrics.stage('figure_cache_get'):
+        cached_figure = figure_cache.get(figure_key)
+    if cached_figure is not None:
+        return cached_figure
+
+    # Fetch the data from yfinance (through the local price cache, or the bar store for intraday bars).
+    # The series was just refreshed; the daily one is read at the version it is now, which the
+    # figure is cached under in case new bars came in since the lookup above.
+    with metrics.stage('price_history'):
+        if intraday:
+            stock_df = bar_store.get_history(stock_symbol, selected_period, interval)
+        else:
+            stock_df, data_version = price_cache.snapshot(stock_symbol, selected_period, interval='1d')
+            figure_key = (stock_symbol, selected_period, short_window, long_window, render_mode, data_version,
+                          interval, source)
+
+    # column names for long and short moving average columns
+    short_window_col = f"{str(short_window)}-EMA"
+    long_window_col = f"{str(long_window)}-EMA"
+
+    # EMA columns and crossover positions; the engine keeps the EMA state between
+    # refreshes and only advances it over bars it has not seen yet. Any other
+    # signal source is computed in one pass and cached per data version.
+    with metrics.stage('indicators'):
+        crossover = indicators.engine.compute((stock_symbol, interval), stock_df['Close'], short_window, long_window)
+        signal = crossover if source == 'ema' else technicals.engine.signal(
+            (stock_symbol, interval), data_version, stock_df, source, intraday=intraday)
+    stock_df[short_window_col] = crossover.short
+    stock_df[long_window_col] = crossover.long
+    stock_df['Position'] = signal.position
+
+    # remove na
+    stock_df = stock_df.fillna(0)
+
+    # Indicator columns keep their NaN warm-up, which plots as a gap
+    indicator_columns = [] if source == 'ema' else list(signal.values)
+    for column in indicator_columns:
+        stock_df[column] = signal.values[column]
+    marker_col = short_window_col if source == 'ema' else 'Close'
+
+    # Everything from here to the layout is Plotly figure construction
+    figure_start = time.perf_counter()
+
+    # In compact mode the price series is bucketed down to the plot width and sent as
+    # typed arrays; bars with a buy/sell marker or a split keep a bucket of their own
+    if render_mode != 'full':
+        keep = np.flatnonzero((stock_df['Position'] != 0) | (stock_df['Stock Splits'] != 0))
+        plot_df = rendering.downsample(stock_df, keep)
+        plot_x, plot_y = rendering.plot_x, rendering.plot_y
+    else:
+        plot_df = stock_df
+        plot_x, plot_y = (lambda index: index), (lambda values: values)
+
+    # Creating the candlestick chart with buy/sell triggers
+    fig = go.Figure(data=[go.Candlestick(x=plot_x(plot_df.index),
+                open=plot_y(plot_df['Open']),
+                high=plot_y(plot_df['High']),
+                low=plot_y(plot_df['Low']),
+                close=plot_y(plot_df['Close']),
+                name='Candlestick')])
+
+    fig.add_trace(go.Scatter(x=plot_x(plot_df.index), y=plot_y(plot_df['Close']),
+                        mode='lines',
+                        name='Closing $',
+                        line=dict(color='rgba(0, 0, 0, 0.5)')))
+
+    fig.add_trace(go.Scatter(x=plot_x(plot_df.index), y=plot_y(plot_df[short_window_col]),
+                        mode='lines',
+                        name=short_window_col,
+                        line=dict(color='#CCFFCC')))
+
+    fig.add_trace(go.Scatter(x=plot_x(plot_df.index), y=plot_y(plot_df[long_window_col]),
+                        mode='lines',
+                        name=long_window_col,
+                        line=dict(color='#FFCCCC')))
+
+    # Add 'buy' signals
+    buy_signals = stock_df[stock_df['Position'] == 1]
+    fig.add_trace(go.Scatter(x=plot_x(buy_signals.index), y=plot_y(buy_signals[marker_col]),
+                        mode='markers',
+                        marker_symbol='triangle-up',
+                        marker_size=15, marker_color='#006400',
+                        name='Buy Signal'))
+
+    # Add 'sell' signals
+    sell_signals = stock_df[stock_df['Position'] == -1]
+    fig.add_trace(go.Scatter(x=plot_x(sell_signals.index), y=plot_y(sell_signals[marker_col]),
+                        mode='markers',
+                        marker_symbol='triangle-down',
+                        marker_size=15, marker_color='#8B0000',
+                        name='Sell Signal'))
+
+    # The selected indicator: bands and VWAP over the price, oscillators in a pane below it
+    oscillator = source in OSCILLATORS
+    for column in indicator_columns:
+        x, y, yaxis = plot_x(plot_df.index), plot_y(plot_df[column]), 'y2' if oscillator else 'y'
+        if column == 'macd_hist':
+            fig.add_trace(go.Bar(x=x, y=y, name=column, yaxis=yaxis, marker_color='rgba(0, 0, 0, 0.3)'))
+        else:
+            fig.add_trace(go.Scatter(x=x, y=y, name=column, yaxis=yaxis, mode='lines',
+                                     line=dict(width=1, dash='dot' if column.startswith('bb_') else 'solid')))
+    if oscillator:
+        fig.update_layout(yaxis=dict(domain=[0.3, 1]),
+                          yaxis2=dict(domain=[0, 0.22], anchor='x', title=technicals.LABELS[source]))
+
+    # Stock splits and dividends, found with vectorized masks and added in one layout update
+    with metrics.stage('overlays'):
+        shapes, annotations, dividend_trace = overlays.corporate_actions(
+            (stock_symbol, interval), data_version, stock_df, compact=render_mode != 'full')
+    if dividend_trace is not None:
+        fig.add_trace(dividend_trace)
+    fig.update_layout(shapes=shapes, annotations=annotations)
+
+    # Add a text card below the X axis title
+    suggestion = indicators.suggestion(signal.last_position)
+
+    fig.add_annotation(
+        x=0.5,  # Positioning in the middle of the X axis
+        y=-0.25,  # Positioning below the X axis
+        text=f"Suggestion: {suggestion}",  # The text you want to display
+        showarrow=False,
+        font=dict(
+            size=10,
+            color="black"
+        ),
+        align="center",
+        bgcolor="white",
+        bordercolor="black",
+        borderwidth=1,
+        borderpad=2,
+        xref="paper",  # Reference to the entire paper for positioning
+        yref="paper"   # Reference to the entire paper for positioning
+    )
+
+    # Customizing the layout
+    fig.update_layout(
+        title=f"{stock_symbol}{' ' + interval if intraday else ''} Candlestick Plot with "
+              f"{'Exponential Moving Average Crossover' if source == 'ema' else technicals.LABELS[source] + ' Signals'}",
+        xaxis_rangeslider_visible=False,  # Hide the range slider at the bottom
+        xaxis_type='date',  # compact mode sends dates as epoch milliseconds
+        xaxis_title='Date',
+        yaxis_title='Price in $',
+        template='plotly_white')
+    # What live mode needs to continue this chart (see live.py)
+    if len(stock_df):
+        stamps = stock_df.index.as_unit('s').asi8
+        fig.update_layout(meta=dict(ticker=stock_symbol, interval=interval, short=short_window, long=long_window,
+                                    source=source, first_ts=int(stamps[0]), last_ts=int(stamps[-1])))
+    if intraday:
+        # Hide nights and weekends, which would otherwise take most of an intraday axis
+        fig.update_xaxes(rangebreaks=[dict(bounds=['sat', 'mon']), dict(bounds=[20, 4], pattern='hour')])
+    metrics.stage_seconds.observe(time.perf_counter() - figure_start, stage='figure')
+
+    rendering.record_render(len(stock_df), len(plot_df), (time.perf_counter() - render_start) * 1000)
+
+    with metrics.stage('figure_cache_put'):
+        figure_cache.put(figure_key, fig)
+    return fig
+
+def remember_chart(stock_symbol, selected_period, short_window, long_window, interval='1d'):
+    # Log the request; rows are written to ticker.db in batches
+    storage.ticker_log.record(stock_symbol)
+
+    # Remember the chart for this visitor only
+    with metrics.stage('session_save'):
+        sessions.save(dash_session_id(), ticker=stock_symbol, period=selected_period,
+                      short_window=short_window, long_window=long_window, interval=interval)
+
+# Layout of the portfolio page: a basket of holdings against a benchmark
+def portfolio_layout():
+    state = sessions.load(dash_session_id())
+    return html.Div([
+        html.Div([
+        html.A('Visual Page', href='/'),
+
+        # Holdings and their weights, separated by commas or spaces
+        html.Div([
+            html.Label('Holdings:'),
+            dcc.Input(id='portfolio-tickers', type='text', value=', '.join(portfolio.DEFAULT_HOLDINGS),
+                      style={'width': '60%'})
+        ]),
+        html.Div([
+            html.Label('Weights (default equal):'),
+            dcc.Input(id='portfolio-weights', type='text', value='')
+        ]),
+
+        html.Label('Time Period:'),
+        dcc.Dropdown(
+            id='portfolio-period',
+            options=[
+                {'label': '6 months', 'value': '6mo'},
+                {'label': '1 year', 'value': '1y'},
+                {'label': '2 year', 'value': '2y'},
+                {'label': '5 years', 'value': '5y'},
+                {'label': '10 years', 'value': '10y'},
+            ],
+            value='1y',  # default value
+            clearable=False
+        ),
+
+        html.Div([
+            html.Label('Benchmark:'),
+            dcc.Input(id='portfolio-benchmark', type='text', value=portfolio.BENCHMARK)
+        ]),
+        html.Div([
+            html.Label('Rolling Window (bars):'),
+            dcc.Input(id='portfolio-window', type='number', value=portfolio.WINDOW)
+        ]),
+
+        # EMA windows of the combined crossover signal, from the session
+        html.Div([
+            html.Label('Short-Term-EMA:'),
+            dcc.Input(id='portfolio-short', type='number', value=state['short_window'])
+        ]),
+        html.Div([
+            html.Label('Long-Term-EMA:'),
+            dcc.Input(id='portfolio-long', type='number', value=state['long_window'])
+        ]),
+
+        html.Button('Analyze', id='portfolio-button', n_clicks=0),
+        html.Div(id='portfolio-status'),
+        ]),
+        dcc.Loading(
+            id='portfolio-loading',
+            type='circle',
+            children=[
+                dcc.Graph(id='portfolio-correlation'),
+                dcc.Graph(id='portfolio-beta'),
+                dcc.Graph(id='portfolio-signal'),
+                html.Table(id='portfolio-holdings'),
+            ],
+            color='black'
+        ),
+        ])
+
+# Callback of the portfolio page's Analyze button
+def update_portfolio(n_clicks, tickers, weights, period, benchmark, window, short_window, long_window):
+    if n_clicks is None:
+        raise PreventUpdate
+
+    try:
+        try:
+            weights = [float(w) for w in re.split(r'[\s,]+', weights or '') if w] or None
+        except ValueError:
+            raise ValueError('Weights must be numbers')
+        result = portfolio.build([t for t in re.split(r'[\s,]+', tickers or '') if t], period,
+                                 int(window or portfolio.WINDOW), short_window, long_window,
+                                 benchmark or portfolio.BENCHMARK, weights)
+    except ValueError as e:
+        empty = go.Figure(layout=dict(template='plotly_white'))
+        return empty, empty, empty, [], str(e)
+
+    status = f"{len(result.tickers)} holdings against {result.benchmark}"
+    if result.missing:
+        status += f"; no price history for {', '.join(result.missing)}"
+    return (*portfolio_figures(result, int(window or portfolio.WINDOW)), holdings_table(result), status)
+
+def portfolio_figures(result, window):
+    """Correlation heatmap, rolling beta and combined signal figures of a portfolio.build() result."""
+    correlation = go.Figure(go.Heatmap(z=result.correlation, x=result.tickers, y=result.tickers,
+                                       zmin=-1, zmax=1, colorscale='RdBu', colorbar=dict(title='Correlation')))
+    correlation.update_layout(title='Correlation of Daily Returns', yaxis_autorange='reversed',
+                              template='plotly_white')
+
+    beta = go.Figure(go.Scatter(x=result.dates, y=result.combined.beta[:, 0], mode='lines', name='Portfolio',
+                                line=dict(color='black', width=3)))
+    # One line per holding only while they stay readable
+    if len(result.tickers) <= MAX_BETA_LINES:
+        for col, ticker in enumerate(result.tickers):
+            beta.add_trace(go.Scatter(x=result.dates, y=result.rolling.beta[:, col], mode='lines', name=ticker,
+                                      line=dict(width=1)))
+    beta.update_layout(title=f'{window}-Bar Rolling Beta against {result.benchmark}', xaxis_title='Date',
+                       yaxis_title='Beta', template='plotly_white')
+
+    signal = go.Figure([
+        go.Scatter(x=result.dates, y=result.growth[:, 0], mode='lines', name='Portfolio',
+                   line=dict(color='black')),
+        go.Scatter(x=result.dates, y=result.growth[:, 1], mode='lines', name=result.benchmark,
+                   line=dict(color='rgba(0, 0, 0, 0.4)', dash='dot')),
+        go.Scatter(x=result.dates, y=result.exposure, mode='lines', name='Long (EMA)', yaxis='y2',
+                   fill='tozeroy', line=dict(color='#006400', width=1), fillcolor='rgba(0, 100, 0, 0.15)'),
+    ])
+    signal.update_layout(title='Growth of $1 and Share of Holdings Long on the EMA Crossover', xaxis_title='Date',
+                         yaxis=dict(title='Value of $1', domain=[0.3, 1]),
+                         yaxis2=dict(title='Long', domain=[0, 0.22], range=[0, 1], anchor='x'),
+                         template='plotly_white')
+    return correlation, beta, signal
+
+def holdings_table(result):
+    # Per-holding statistics over the last rolling window
+    def cell(value, fmt):
+        return '' if value != value else format(value, fmt)
+
+    last = [values[-1] if len(values) else np.full(len(result.tickers), np.nan) for values in result.rolling]
+    header = html.Tr([html.Th(name) for name in ('Ticker', 'Weight', 'Beta', 'Correlation', 'Volatility',
+                                                 'Suggestion', 'Since')])
+    rows = [html.Tr([html.Td(ticker), html.Td(cell(result.weights[col], '.1%')),
+                     html.Td(cell(last[2][col], '.2f')), html.Td(cell(last[1][col], '.2f')),
+                     html.Td(cell(last[3][col] * np.sqrt(portfolio.YEAR), '.1%')),
+                     html.Td(result.suggestion[col]), html.Td(result.since[col] or '')])
+            for col, ticker in enumerate(result.tickers)]
+    return [header] + rows
+
+def create_app(path):
+    """The Dash app, served under `path`."""
+    # Each page's components only exist while it is shown, hence suppress_callback_exceptions
+    dash_app = dash.Dash(__name__, requests_pathname_prefix=path, suppress_callback_exceptions=True)
+    dash_app.server.after_request(record_figure_payload)
+
+    dash_app.layout = serve_layout
+    dash_app.callback(Output('page-content', 'children'), Input('url', 'pathname'))(render_page)
+
+    # Live mode: the browser subscribes to /live/stream for the chart on screen and
+    # appends the bars it receives every second, without asking the server again
+    dash_app.clientside_callback(
+        "function(value) { return !(value && value.length); }",
+        Output('live-interval', 'disabled'),
+        Input('live-toggle', 'value'))
+
+    dash_app.clientside_callback(
+        ClientsideFunction(namespace='live', function_name='drain'),
+        Output('stock-graph', 'extendData'),
+        [Input('live-interval', 'n_intervals'), Input('live-toggle', 'value')],
+        State('stock-graph', 'figure'))
+
+    dash_app.callback(
+        Output('stock-graph', 'figure'),
+        [Input('refresh-button', 'n_clicks')],
+        [State('stock-input', 'value'),
+         State('period-dropdown', 'value'),
+         State('short-time-window-input', 'value'),
+         State('long-time-window-input', 'value'),
+         State('render-mode-radio', 'value'),
+         State('interval-dropdown', 'value'),
+         State('signal-dropdown', 'value')])(update_graph)
+
+    dash_app.callback(
+        [Output('portfolio-correlation', 'figure'),
+         Output('portfolio-beta', 'figure'),
+         Output('portfolio-signal', 'figure'),
+         Output('portfolio-holdings', 'children'),
+         Output('portfolio-status', 'children')],
+        [Input('portfolio-button', 'n_clicks')],
+        [State('portfolio-tickers', 'value'),
+         State('portfolio-weights', 'value'),
+         State('portfolio-period', 'value'),
+         State('portfolio-benchmark', 'value'),
+         State('portfolio-window', 'value'),
+         State('portfolio-short', 'value'),
+         State('portfolio-long', 'value')])(update_portfolio)
+    return dash_app
@@ -0,0 +1,35 @@
+# data_access.py
+# Runs the blocking work of the FastAPI handlers (SQLite, EDGAR downloads,
+# file reads, yfinance) on a bounded thread pool so the event loop never
+# blocks, and lets concurrent requests for the same resource share one call.
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# Size of the blocking I/O pool, configurable through the environment
+IO_POOL_SIZE = int(os.environ.get('STOCKS_IO_POOL_SIZE', '16'))
+
+executor = ThreadPoolExecutor(IO_POOL_SIZE, thread_name_prefix='stocks-io')
+
+# In-flight calls per key, so identical concurrent requests await the same future
+_inflight = {}
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run `func(*args, **kwargs)` on the I/O pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+
+async def coalesce(key, func, *args, **kwargs):
+    """Like run_blocking, but callers passing the same `key` while a call is
+    still running get that call's result instead of starting another one."""
+    future = _inflight.get(key)
+    if future is None:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(executor, partial(func, *args, **kwargs))
+        _inflight[key] = future
+        future.add_done_callback(lambda _: _inflight.pop(key, None))
+    # Shielded so one cancelled request does not cancel the call for the others
+    return await asyncio.shield(future)
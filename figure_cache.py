@@ -0,0 +1,143 @@
+# figure_cache.py
+# Memoized update_graph figures.
+#
+# Figures are cached as serialized JSON under a key made of the chart
+# parameters and the price cache version of the ticker, so a new bar in the
+# price cache makes every older entry unreachable. Entries live in a
+# per-process LRU bounded by bytes and in a shared directory on local disk
+# that every worker reads and writes; the directory is trimmed by least
+# recent use (file mtime) when it grows past its budget.
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+FIGURE_DIR = 'figure-cache'
+
+MAX_MEMORY_BYTES = int(os.environ.get('STOCKS_FIGURE_CACHE_MEMORY_MB', '64')) * 1024 * 1024
+MAX_DISK_BYTES = int(os.environ.get('STOCKS_FIGURE_CACHE_DISK_MB', '512')) * 1024 * 1024
+
+# Minimum time between two sweeps of the disk tier
+SWEEP_INTERVAL = 30.0
+
+_memory = OrderedDict()
+_memory_bytes = 0
+_lock = threading.Lock()
+_stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+_last_sweep = 0.0
+
+
+def _digest(key):
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+def _path(digest):
+    return os.path.join(FIGURE_DIR, digest[:2], digest + '.json')
+
+
+def _remember(digest, payload):
+    # Insert into the memory tier, evicting least recently used entries over budget
+    global _memory_bytes
+    with _lock:
+        if digest in _memory:
+            _memory.move_to_end(digest)
+            return
+        _memory[digest] = payload
+        _memory_bytes += len(payload)
+        while _memory_bytes > MAX_MEMORY_BYTES and len(_memory) > 1:
+            _, evicted = _memory.popitem(last=False)
+            _memory_bytes -= len(evicted)
+            _stats['evictions'] += 1
+
+
+def get(key):
+    """Cached figure (as a plotly JSON dict) for `key`, or None."""
+    digest = _digest(key)
+    with _lock:
+        payload = _memory.get(digest)
+        if payload is not None:
+            _memory.move_to_end(digest)
+            _stats['memory_hits'] += 1
+    if payload is None:
+        path = _path(digest)
+        try:
+            with open(path, 'rb') as file:
+                payload = file.read()
+            os.utime(path)
+        except OSError:
+            with _lock:
+                _stats['misses'] += 1
+            return None
+        with _lock:
+            _stats['disk_hits'] += 1
+        _remember(digest, payload)
+    return json.loads(payload)
+
+
+def put(key, fig):
+    """Cache `fig` (a plotly Figure) under `key`."""
+    digest = _digest(key)
+    payload = fig.to_json().encode()
+    _remember(digest, payload)
+
+    path = _path(digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written under a temporary name first so other workers never read half a file
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(payload)
+    os.replace(tmp_path, path)
+    _maybe_sweep()
+
+
+def _maybe_sweep():
+    global _last_sweep
+    now = time.time()
+    with _lock:
+        if now - _last_sweep < SWEEP_INTERVAL:
+            return
+        _last_sweep = now
+
+    entries = []
+    for root, _, files in os.walk(FIGURE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    # Trim to 90% of the budget so the next sweeps have some headroom
+    for _, size, path in sorted(entries):
+        if total <= MAX_DISK_BYTES * 0.9:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        with _lock:
+            _stats['evictions'] += 1
+
+
+def clear():
+    """Drop every cached figure, in memory and on disk."""
+    global _memory_bytes
+    with _lock:
+        _memory.clear()
+        _memory_bytes = 0
+    shutil.rmtree(FIGURE_DIR, ignore_errors=True)
+
+
+def stats():
+    with _lock:
+        hits = _stats['memory_hits'] + _stats['disk_hits']
+        lookups = hits + _stats['misses']
+        return dict(_stats,
+                    hit_rate=round(hits / lookups, 4) if lookups else 0.0,
+                    memory_entries=len(_memory),
+                    memory_bytes=_memory_bytes)
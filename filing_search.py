@@ -0,0 +1,186 @@
+# filing_search.py
+# Full-text search over the downloaded filings.
+#
+# Every filing indexed in filings.db is split into its items (see
+# filing_text.py) and stored in an SQLite FTS5 table next to it. Ingestion is
+# incremental: only filings not ingested yet are parsed, in a process pool
+# when there are several, so a backfill of hundreds of filings uses every
+# core. A background Ingester picks up new downloads, and one run can be
+# started by hand for a backfill:
+#
+#   python filing_search.py [--workers 8]
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import filing_text
+import filings
+import storage
+
+INGEST_WORKERS = int(os.environ.get('STOCKS_FILING_INGEST_WORKERS', '0')) or os.cpu_count() or 1
+LOCK_FILE = 'filing-search.lock'
+
+# Most results a search returns
+MAX_RESULTS = 100
+
+# Relative weight of the indexed columns: section, title, body
+_WEIGHTS = (1.0, 4.0, 1.0)
+
+
+def _create_tables(conn):
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS filing_text USING fts5(
+                        ticker UNINDEXED, form UNINDEXED, accession UNINDEXED, filed UNINDEXED,
+                        path UNINDEXED, section, title, body,
+                        tokenize = 'porter unicode61')''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS ingested (
+                        ticker TEXT NOT NULL,
+                        form TEXT NOT NULL,
+                        accession TEXT NOT NULL,
+                        sections INTEGER NOT NULL,
+                        ingested_at REAL NOT NULL,
+                        PRIMARY KEY (ticker, form, accession))''')
+
+
+_pool = storage.ConnectionPool(filings.FILING_DB, setup=_create_tables)
+
+
+def pending():
+    """(ticker, form, accession, filed, path) of indexed filings not ingested yet."""
+    with _pool.connection() as conn:
+        return conn.execute('''SELECT f.ticker, f.form, f.accession, f.filed, f.path FROM filings f
+                               LEFT JOIN ingested i USING (ticker, form, accession)
+                               WHERE i.accession IS NULL
+                               ORDER BY f.ticker, f.form, f.filed''').fetchall()
+
+
+def _store(conn, filing, sections):
+    ticker, form, accession, filed, path = filing
+    conn.execute('DELETE FROM filing_text WHERE ticker = ? AND form = ? AND accession = ?', (ticker, form, accession))
+    conn.executemany('''INSERT INTO filing_text (ticker, form, accession, filed, path, section, title, body)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                     [(ticker, form, accession, filed, path, section, title, body) for section, title, body in sections])
+    conn.execute('INSERT OR REPLACE INTO ingested (ticker, form, accession, sections, ingested_at) VALUES (?, ?, ?, ?, ?)',
+                 (ticker, form, accession, len(sections), time.time()))
+
+
+def ingest(workers=INGEST_WORKERS):
+    """Parse and index every filing not ingested yet; returns how many were ingested."""
+    todo = pending()
+    if not todo:
+        return 0
+    paths = [filing[4] for filing in todo]
+    if workers > 1 and len(todo) > 1:
+        # spawn, not fork: the server process has threads (and locks they may
+        # hold); the workers only import filing_text
+        with ProcessPoolExecutor(min(workers, len(todo)), mp_context=get_context('spawn')) as pool:
+            results = pool.map(filing_text.extract, paths, chunksize=4)
+            for filing, sections in zip(todo, results):
+                with _pool.connection() as conn:
+                    _store(conn, filing, sections)
+    else:
+        for filing, path in zip(todo, paths):
+            sections = filing_text.extract(path)
+            with _pool.connection() as conn:
+                _store(conn, filing, sections)
+    return len(todo)
+
+
+def _fts_query(query):
+    # Every word as a quoted term, for input that is not valid FTS5 syntax
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+def search(query, ticker=None, form=None, section=None, limit=20):
+    """Best matching filing sections for `query`, with a highlighted snippet each.
+
+    `query` is FTS5 syntax (words, "phrases", OR, NOT, prefix*); input that
+    is not valid syntax is searched as plain words.
+    """
+    where, params = ['filing_text MATCH ?'], [query]
+    if ticker:
+        where.append('ticker = ?')
+        params.append(ticker.upper())
+    if form:
+        where.append('form = ?')
+        params.append(form.upper())
+    if section:
+        where.append('section = ?')
+        params.append(section if section.lower().startswith('item') else f'Item {section.upper()}')
+    sql = f'''SELECT ticker, form, accession, filed, path, section, title,
+                     snippet(filing_text, 7, '<b>', '</b>', ' … ', 32),
+                     bm25(filing_text, 0, 0, 0, 0, 0, {", ".join(map(str, _WEIGHTS))}) AS rank
+              FROM filing_text WHERE {" AND ".join(where)}
+              ORDER BY rank LIMIT ?'''
+    params.append(min(limit, MAX_RESULTS))
+    with _pool.connection() as conn:
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            params[0] = _fts_query(query)
+            if not params[0]:
+                return []
+            rows = conn.execute(sql, params).fetchall()
+    return [
+        {'ticker': ticker, 'form': form, 'accession': accession, 'filed': filed, 'url': '/' + path,
+         'section': section, 'title': title, 'snippet': snippet, 'score': -rank}
+        for ticker, form, accession, filed, path, section, title, snippet, rank in rows
+    ]
+
+
+def stats():
+    with _pool.connection() as conn:
+        ingested, sections = conn.execute('SELECT COUNT(*), COALESCE(SUM(sections), 0) FROM ingested').fetchone()
+    return {'filings': ingested, 'sections': sections, 'pending': len(pending())}
+
+
+class Ingester:
+    """Background thread indexing new filings every `period` seconds, in one worker process at a time."""
+
+    def __init__(self, period=60.0):
+        self.period = period
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        handle = storage.try_lock(LOCK_FILE)
+        if handle is None:
+            # Another worker is ingesting
+            return 0
+        try:
+            filings.index_disk()
+            return ingest()
+        finally:
+            handle.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                # Keep going, the next round retries it
+                pass
+            self._stop.wait(self.period)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='filing-ingester', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Index every filing under sec-edgar-filings/ for search.')
+    parser.add_argument('--workers', type=int, default=INGEST_WORKERS)
+    args = parser.parse_args()
+    started = time.time()
+    filings.index_disk()
+    count = ingest(args.workers)
+    print(f'ingested {count} filings in {time.time() - started:.1f}s with {args.workers} workers')
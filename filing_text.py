@@ -0,0 +1,103 @@
+# filing_text.py
+# Plain text and item sections of a 10-K / 10-Q HTML filing.
+#
+# Kept free of the app's heavier imports, since it also runs in the worker
+# processes of the search ingestion (see filing_search.py).
+import re
+from html.parser import HTMLParser
+
+# Tags that start a new line of text, and tags whose content is never text
+_BLOCK_TAGS = {'p', 'div', 'br', 'tr', 'li', 'ul', 'ol', 'table', 'section', 'article',
+               'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+_SKIP_TAGS = {'script', 'style', 'head', 'ix:header'}
+
+_PART = re.compile(r'^part\s+(iv|i{1,3})\b', re.IGNORECASE)
+_ITEM = re.compile(r'^item\s+(\d{1,2}[a-c]?)\s*[.:\-–—]?\s*(.{0,150})$', re.IGNORECASE)
+
+# Headings longer than this are sentences mentioning an item, not headings
+_MAX_TITLE = 150
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+        elif tag in ('td', 'th'):
+            self.parts.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip = max(self._skip - 1, 0)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def html_to_text(html):
+    """Visible text of `html`, one line per block element, without blank lines."""
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    text = ''.join(parser.parts).replace('\xa0', ' ')
+    lines = (' '.join(line.split()) for line in text.split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+def split_sections(text):
+    """(section, title, body) for every item of the filing, e.g. ('Item 1A', 'Risk Factors', ...).
+
+    An item heading usually appears twice, in the table of contents and
+    above the item itself; the occurrence followed by the most text wins.
+    A document without item headings is a single 'Document' section.
+    """
+    lines = text.split('\n')
+    headings = []
+    part = None
+    for number, line in enumerate(lines):
+        match = _PART.match(line)
+        if match and len(line) <= _MAX_TITLE:
+            part = match.group(1).upper()
+            continue
+        match = _ITEM.match(line)
+        if not match:
+            continue
+        title = match.group(2).strip()
+        if not title and number + 1 < len(lines) and len(lines[number + 1]) <= _MAX_TITLE:
+            # Heading laid out in table cells: the title is on the next line
+            title = lines[number + 1]
+        headings.append((number, part, f'Item {match.group(1).upper()}', title))
+
+    if not headings:
+        return [('Document', '', text)] if text else []
+
+    best = {}
+    for i, (number, part, section, title) in enumerate(headings):
+        end = headings[i + 1][0] if i + 1 < len(headings) else len(lines)
+        body = '\n'.join(lines[number + 1:end])
+        key = (part, section)
+        if key not in best or len(body) > len(best[key][1][2]):
+            best[key] = (number, (section, title, body))
+    return [section for _, section in sorted(best.values())]
+
+
+def extract(path):
+    """Sections of the filing HTML at `path`; runs in the ingestion worker processes.
+
+    An unreadable or vanished file has no sections, so it is not retried forever.
+    """
+    try:
+        with open(path, 'rb') as file:
+            html = file.read().decode('utf-8', errors='replace')
+    except OSError:
+        return []
+    return split_sections(html_to_text(html))
@@ -0,0 +1,183 @@
+# filings.py
+# Index of the SEC filings downloaded into sec-edgar-filings/.
+#
+# Every (ticker, form, accession) on disk is recorded in filings.db, so
+# repeat /10k and /10q requests are served straight from disk. Checking EDGAR
+# for newer filings is left to a background thread that revisits every
+# indexed (ticker, form) on a schedule, outside the request path, in one
+# worker process at a time.
+import os
+import re
+import threading
+import time
+
+import metrics
+import storage
+
+FILING_DB = 'filings.db'
+FILING_DIR = 'sec-edgar-filings'
+LOCK_FILE = 'filing-refresh.lock'
+
+# How often EDGAR is checked for a newer filing of an indexed (ticker, form)
+REFRESH_INTERVAL = float(os.environ.get('STOCKS_FILING_REFRESH_HOURS', '12')) * 3600
+
+_FILED_DATE = re.compile(rb'FILED AS OF DATE:\s*(\d{8})')
+
+_key_locks = {}
+_key_locks_guard = threading.Lock()
+
+
+def _create_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS filings (
+                        ticker TEXT NOT NULL,
+                        form TEXT NOT NULL,
+                        accession TEXT NOT NULL,
+                        path TEXT NOT NULL,
+                        filed TEXT,
+                        indexed_at REAL NOT NULL,
+                        PRIMARY KEY (ticker, form, accession))''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS checks (
+                        ticker TEXT NOT NULL,
+                        form TEXT NOT NULL,
+                        checked_at REAL NOT NULL,
+                        PRIMARY KEY (ticker, form))''')
+
+
+_pool = storage.ConnectionPool(FILING_DB, setup=_create_tables)
+
+
+def _key_lock(key):
+    with _key_locks_guard:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def _filed_date(folder):
+    # The SEC header of the full submission carries the filing date
+    try:
+        with open(os.path.join(folder, 'full-submission.txt'), 'rb') as file:
+            match = _FILED_DATE.search(file.read(4096))
+    except OSError:
+        return None
+    return match.group(1).decode() if match else None
+
+
+def _index(conn, ticker, form, checked=True):
+    # Record every accession folder on disk that is not indexed yet; `checked`
+    # marks the (ticker, form) as just looked up on EDGAR
+    path = f'{FILING_DIR}/{ticker}/{form}'
+    known = {row[0] for row in conn.execute('SELECT accession FROM filings WHERE ticker = ? AND form = ?',
+                                            (ticker, form))}
+    now = time.time()
+    for accession in sorted(os.listdir(path)) if os.path.isdir(path) else []:
+        folder = f'{path}/{accession}'
+        html_files = sorted(f for f in os.listdir(folder) if f.endswith('.html'))
+        if accession in known or not html_files:
+            continue
+        html_file = 'primary-document.html' if 'primary-document.html' in html_files else html_files[-1]
+        # Other threads and workers index the same folders; a row someone else added first is kept
+        conn.execute('''INSERT OR IGNORE INTO filings (ticker, form, accession, path, filed, indexed_at)
+                        VALUES (?, ?, ?, ?, ?, ?)''',
+                     (ticker, form, accession, f'{folder}/{html_file}', _filed_date(folder), now))
+    if checked:
+        conn.execute('INSERT OR REPLACE INTO checks (ticker, form, checked_at) VALUES (?, ?, ?)', (ticker, form, now))
+    conn.commit()
+
+
+def download(ticker, form):
+    """Ask the filing provider for the latest `form` of `ticker` and index whatever is new on disk."""
+    with _key_lock((ticker, form)):
+        # providers brings in pandas, which the filing routes otherwise never need
+        import providers
+        with metrics.stage('edgar_download'):
+            providers.filing_provider().download(ticker, form, FILING_DIR)
+        with _pool.connection() as conn:
+            _index(conn, ticker, form)
+
+
+def index_disk():
+    """Index every filing on disk, including ones copied into FILING_DIR by hand."""
+    if not os.path.isdir(FILING_DIR):
+        return
+    with _pool.connection() as conn:
+        for ticker in sorted(os.listdir(FILING_DIR)):
+            forms = f'{FILING_DIR}/{ticker}'
+            for form in sorted(os.listdir(forms)) if os.path.isdir(forms) else []:
+                _index(conn, ticker, form, checked=False)
+
+
+def _latest(conn, ticker, form):
+    rows = conn.execute('''SELECT accession, path FROM filings WHERE ticker = ? AND form = ?
+                           ORDER BY filed DESC, indexed_at DESC, accession DESC''', (ticker, form)).fetchall()
+    for accession, path in rows:
+        if os.path.exists(path):
+            return path
+        # Removed from disk behind our back
+        conn.execute('DELETE FROM filings WHERE ticker = ? AND form = ? AND accession = ?', (ticker, form, accession))
+        conn.commit()
+    return None
+
+
+def latest_path(ticker, form):
+    """Path of the latest indexed `form` HTML for `ticker`, downloading it the first time only."""
+    with _pool.connection() as conn:
+        path = _latest(conn, ticker, form)
+        if path is None:
+            # Files downloaded before the index existed only need indexing
+            _index(conn, ticker, form)
+            path = _latest(conn, ticker, form)
+    if path is None:
+        download(ticker, form)
+        with _pool.connection() as conn:
+            path = _latest(conn, ticker, form)
+    if path is None:
+        raise FileNotFoundError(f'No {form} filing found for {ticker}')
+    return path
+
+
+def refresh_due(now=None):
+    """Re-check EDGAR for every indexed (ticker, form) not checked within REFRESH_INTERVAL."""
+    now = now or time.time()
+    with _pool.connection() as conn:
+        due = conn.execute('SELECT ticker, form FROM checks WHERE checked_at < ?', (now - REFRESH_INTERVAL,)).fetchall()
+    for ticker, form in due:
+        try:
+            download(ticker, form)
+        except Exception:
+            # Keep going, the next round retries it
+            continue
+
+
+class Refresher:
+    """Background thread running refresh_due every `period` seconds, in one worker process at a time."""
+
+    def __init__(self, period=60.0):
+        self.period = period
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        handle = storage.try_lock(LOCK_FILE)
+        if handle is None:
+            # Another worker is refreshing
+            return
+        try:
+            refresh_due()
+        finally:
+            handle.close()
+
+    def _run(self):
+        while not self._stop.wait(self.period):
+            try:
+                self.run_once()
+            except Exception:
+                # Keep going, the next round retries it
+                pass
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='filing-refresher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
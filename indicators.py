@@ -0,0 +1,242 @@
+# indicators.py
+# Incremental EMA / crossover engine used by update_graph.
+#
+# The EMA state of every (series, span) pair is kept between requests, so a
+# refresh that only brings in new bars advances the state over those bars
+# instead of recomputing the full history.
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+# Maximum number of cached EMA / signal series kept in memory
+MAX_ENTRIES = 4096
+
+Crossover = namedtuple('Crossover', ['short', 'long', 'position', 'last_position'])
+
+
+class EMAState:
+    """Running state of pandas' ``ewm(span=span, adjust=True).mean()``.
+
+    The update rule mirrors pandas' own implementation step by step, so
+    advancing the state bar by bar gives bit-identical results.
+    """
+    __slots__ = ('factor', 'weighted', 'old_wt')
+
+    def __init__(self, span):
+        com = (span - 1) / 2.0
+        alpha = 1.0 / (1.0 + com)
+        self.factor = 1.0 - alpha
+        self.weighted = np.nan
+        self.old_wt = 1.0
+
+    def copy(self):
+        state = EMAState.__new__(EMAState)
+        state.factor, state.weighted, state.old_wt = self.factor, self.weighted, self.old_wt
+        return state
+
+    def advance(self, values):
+        out = np.empty(len(values))
+        factor, weighted, old_wt = self.factor, self.weighted, self.old_wt
+        for i, cur in enumerate(values.tolist()):
+            if weighted == weighted:
+                old_wt *= factor
+                if cur == cur:
+                    if weighted != cur:
+                        weighted = (old_wt * weighted + cur) / (old_wt + 1.0)
+                    old_wt += 1.0
+            elif cur == cur:
+                weighted = cur
+            out[i] = weighted
+        self.weighted, self.old_wt = weighted, old_wt
+        return out
+
+
+def ema_matrix(values, span):
+    """Column-wise ``ewm(span=span, adjust=True).mean()`` of a 2-D (bars x series) array.
+
+    `span` is a scalar or one span per column. NaN cells are treated as bars
+    the column does not have: they neither update nor decay its state and
+    carry the previous value, so every column matches pandas run on that
+    column with its NaNs dropped.
+    """
+    values = np.asarray(values, dtype='float64')
+    span = np.broadcast_to(np.asarray(span, dtype='float64'), values.shape[1:])
+    com = (span - 1) / 2.0
+    factor = 1.0 - 1.0 / (1.0 + com)
+
+    out = np.empty_like(values)
+    weighted = np.full(values.shape[1:], np.nan)
+    old_wt = np.ones(values.shape[1:])
+    for i in range(len(values)):
+        cur = values[i]
+        observed = cur == cur
+        started = weighted == weighted
+        step = started & observed
+        old_wt = np.where(step, old_wt * factor, old_wt)
+        blended = (old_wt * weighted + cur) / (old_wt + 1.0)
+        # pandas leaves the average untouched when it already equals the value
+        weighted = np.where(step & (weighted != cur), blended, weighted)
+        old_wt = np.where(step, old_wt + 1.0, old_wt)
+        weighted = np.where(~started & observed, cur, weighted)
+        out[i] = weighted
+    return out
+
+
+def check_windows(*windows):
+    """Raise ValueError unless every EMA window is at least one bar."""
+    for window in windows:
+        if window is None or window < 1:
+            raise ValueError(f'EMA windows must be at least 1 bar, got {window}')
+
+
+def crossover_matrix(closes, short_window, long_window):
+    """Vectorized counterpart of CrossoverEngine.compute for a (bars x series) array.
+
+    Returns rounded short/long EMAs and positions with the same semantics as
+    update_graph; positions are 0 up to and including each column's first bar.
+    """
+    short = ema_matrix(closes, short_window).round(2)
+    long = ema_matrix(closes, long_window).round(2)
+    signal = np.where(short > long, 1.0, 0.0)
+    position = np.diff(signal, axis=0, prepend=signal[:1])
+    started = np.maximum.accumulate(closes == closes, axis=0)
+    first = np.argmax(started, axis=0)
+    position[~started] = 0.0
+    position[first, np.arange(closes.shape[1])] = 0.0
+    return short, long, position
+
+
+def last_crossings(position):
+    """Row index and value of the last non-zero position per column (-1 and 0 when none)."""
+    crossed = position != 0
+    rows = len(position) - 1 - np.argmax(crossed[::-1], axis=0)
+    rows = np.where(crossed.any(axis=0), rows, -1)
+    values = np.where(rows >= 0, position[rows, np.arange(position.shape[1])], 0.0)
+    return rows, values
+
+
+def suggestion(last_position):
+    """'Buy' or 'Sell' after the last crossing in that direction, 'Hold' before any crossing."""
+    if last_position == 1.0:
+        return 'Buy'
+    if last_position == -1.0:
+        return 'Sell'
+    return 'Hold'
+
+
+def _resume_at(seen_stamps, seen_closes, stamps, closes):
+    # Index from which `stamps`/`closes` must be (re)computed; everything
+    # before the previously seen last bar has to match what was seen. The EMA
+    # starts at the first bar, so a slice starting elsewhere starts over.
+    n = len(seen_stamps)
+    if n == 0 or len(stamps) < n or stamps[0] != seen_stamps[0]:
+        return 0
+    if n >= 2 and (stamps[n - 2] != seen_stamps[n - 2] or closes[n - 2] != seen_closes[n - 2]):
+        return 0
+    return n - 1
+
+
+class _EMASeries:
+    # EMA values of one series plus the state right before its last bar, which
+    # is recomputed on every update since it may have been a partial bar
+    def __init__(self, span):
+        self.span = span
+        self.reset()
+
+    def reset(self):
+        self.state = EMAState(self.span)
+        self.stamps = np.empty(0, dtype='int64')
+        self.closes = np.empty(0)
+        self.values = np.empty(0)
+
+    def update(self, stamps, closes):
+        start = _resume_at(self.stamps, self.closes, stamps, closes)
+        if start == 0:
+            self.reset()
+        head = self.state.advance(closes[start:-1])
+        last = self.state.copy().advance(closes[-1:])
+        self.values = np.concatenate([self.values[:start], head, last])
+        self.stamps = stamps
+        self.closes = closes
+        return start
+
+
+class _SignalSeries:
+    # Crossover signal of one span pair; its EMAs are shared with other pairs
+    # and may have moved on to other data since this pair was last computed
+    def __init__(self):
+        self.stamps = np.empty(0, dtype='int64')
+        self.closes = np.empty(0)
+        self.signal = np.empty(0)
+        self.position = np.empty(0)
+        self.crossings = []
+
+    def resume_at(self, stamps, closes):
+        return _resume_at(self.stamps, self.closes, stamps, closes)
+
+    def update(self, start, stamps, closes, short, long):
+        self.stamps, self.closes = stamps, closes
+        if start == 0:
+            self.crossings = []
+        signal = np.where(short[start:] > long[start:], 1.0, 0.0)
+        position = np.diff(signal, prepend=self.signal[start - 1] if start else signal[0])
+        self.signal = np.concatenate([self.signal[:start], signal])
+        self.position = np.concatenate([self.position[:start], position])
+
+        while self.crossings and self.crossings[-1] >= start:
+            self.crossings.pop()
+        self.crossings.extend((np.flatnonzero(position) + start).tolist())
+
+
+class CrossoverEngine:
+    """Keeps EMA and crossover state per (series key, span) between calls."""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, key, factory):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = factory()
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(key)
+        return entry
+
+    def compute(self, key, close, short_window, long_window):
+        """EMA crossover of the `close` series, same as the pandas pipeline in update_graph.
+
+        `key` identifies the series (e.g. ticker and interval). EMAs are
+        rounded to 2 decimals before comparing, and the first position is 0.
+        """
+        if len(close) == 0:
+            # No history: the index may not even be a DatetimeIndex
+            empty = np.empty(0)
+            return Crossover(empty, empty, empty, None)
+        stamps = close.index.as_unit('ns').asi8
+        closes = close.to_numpy(dtype='float64')
+
+        # One entry per series and spans; a slice that starts at another bar
+        # than the previous call (e.g. '1y' a day later) recomputes it
+        base = (key,)
+        with self._lock:
+            short_series = self._entry(base + ('ema', short_window), lambda: _EMASeries(short_window))
+            long_series = self._entry(base + ('ema', long_window), lambda: _EMASeries(long_window))
+            signal_series = self._entry(base + ('signal', short_window, long_window), _SignalSeries)
+
+            start = min(short_series.update(stamps, closes), long_series.update(stamps, closes),
+                        signal_series.resume_at(stamps, closes))
+            short = short_series.values.round(2)
+            long = long_series.values.round(2)
+            signal_series.update(start, stamps, closes, short, long)
+
+            position = signal_series.position
+            last_position = position[signal_series.crossings[-1]] if signal_series.crossings else None
+            return Crossover(short, long, position.copy(), last_position)
+
+
+engine = CrossoverEngine()
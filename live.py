@@ -0,0 +1,213 @@
+# live.py
+# Live chart updates pushed over server-sent events.
+#
+# Every (ticker, interval) watched by at least one browser has one Feed, a
+# thread that polls for new bars every POLL_INTERVAL seconds however many
+# viewers there are. Upstream calls are shared further through the price
+# cache and the bar store, which every worker reads: a worker that finds the
+# bars fetched by another one recently enough does not fetch them again.
+#
+# Viewers of the same chart (same first bar, EMA windows and signal source)
+# share one incremental crossover computation; each viewer is sent only the
+# completed bars it has not got yet, which the browser appends with extendData.
+import asyncio
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import bar_store
+import indicators
+import price_cache
+import rendering
+import technicals
+
+POLL_INTERVAL = float(os.environ.get('STOCKS_LIVE_POLL_SECONDS', '30'))
+
+# Most (ticker, interval) feeds polling at once in a worker
+MAX_FEEDS = int(os.environ.get('STOCKS_LIVE_MAX_FEEDS', '100'))
+
+INTERVAL_SECONDS = {'1m': 60, '5m': 300, '15m': 900, '1h': 3600, '1d': 86400}
+
+
+class Subscription:
+    """One browser's stream: the chart it shows and the queue its events go to."""
+
+    def __init__(self, first_ts, since, short_window, long_window, source, loop):
+        self.chart = (first_ts, short_window, long_window, source)
+        self.since = since
+        self.queue = asyncio.Queue()
+        self.loop = loop
+
+    def push(self, event):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+
+def _bars(ticker, interval, first_ts):
+    # The series a chart starting at `first_ts` was drawn from, up to the latest stored bar
+    first = pd.Timestamp(first_ts, unit='s', tz=price_cache.MARKET_TZ)
+    if interval == '1d':
+        df = price_cache.get_history(ticker, price_cache.BASE_PERIOD)
+        return df[df.index >= first]
+    stored = bar_store.INTERVALS[interval][0]
+    table = bar_store.read(ticker, stored, first_day=f'{first:%Y%m%d}', start=first_ts)
+    if interval != stored:
+        table = bar_store.resample(table, bar_store.MINUTES[interval])
+    return bar_store.to_frame(table)
+
+
+def _values(values):
+    # JSON has no NaN
+    return [None if value != value else value for value in np.round(values, 4).tolist()]
+
+
+def _event(df, crossover, position, marker, values, rows):
+    # Columns of the new bars, in the units the compact chart uses; markers
+    # sit on the `marker` series, as in update_graph
+    position = position[rows]
+    marker = marker[rows]
+    x = rendering.plot_x(df.index[rows])
+    return {
+        'x': x.tolist(),
+        'open': df['Open'].to_numpy()[rows].round(2).tolist(),
+        'high': df['High'].to_numpy()[rows].round(2).tolist(),
+        'low': df['Low'].to_numpy()[rows].round(2).tolist(),
+        'close': df['Close'].to_numpy()[rows].round(2).tolist(),
+        'short': crossover.short[rows].tolist(),
+        'long': crossover.long[rows].tolist(),
+        'buy_x': x[position == 1].tolist(), 'buy_y': marker[position == 1].tolist(),
+        'sell_x': x[position == -1].tolist(), 'sell_y': marker[position == -1].tolist(),
+        # Indicator traces follow the six above, in technicals.COLUMNS order
+        'indicators': [_values(column[rows]) for column in values.values()],
+    }
+
+
+class Feed:
+    """Single poller of one (ticker, interval) for all of its subscribers."""
+
+    def __init__(self, ticker, interval):
+        self.ticker = ticker
+        self.interval = interval
+        self.subscribers = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'live-{ticker}-{interval}', daemon=True)
+
+    def _refresh(self):
+        if self.interval == '1d':
+            return price_cache.refresh(self.ticker)
+        return bar_store.refresh(self.ticker, bar_store.INTERVALS[self.interval][0], ttl=POLL_INTERVAL)
+
+    def poll(self):
+        version = self._refresh()
+        with self._lock:
+            subscribers = list(self.subscribers)
+        now = time.time()
+        for chart in {sub.chart for sub in subscribers}:
+            first_ts, short_window, long_window, source = chart
+            df = _bars(self.ticker, self.interval, first_ts)
+            if df.empty:
+                continue
+            key = (self.ticker, self.interval)
+            crossover = indicators.engine.compute(key, df['Close'], short_window, long_window)
+            if source == 'ema':
+                position, marker, values = crossover.position, crossover.short, {}
+            else:
+                signal = technicals.engine.signal(key, version, df, source, intraday=self.interval != '1d')
+                position, marker, values = signal.position, df['Close'].to_numpy(), signal.values
+            stamps = df.index.as_unit('s').asi8
+            # A bar is only sent once its period is over, so it never has to be replaced
+            completed = stamps + INTERVAL_SECONDS[self.interval] <= now
+            for sub in subscribers:
+                if sub.chart != chart:
+                    continue
+                rows = np.flatnonzero(completed & (stamps > sub.since))
+                if len(rows):
+                    sub.push(_event(df, crossover, position, marker, values, rows))
+                    sub.since = int(stamps[rows[-1]])
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception:
+                # Keep going, the next poll retries it
+                pass
+            self._stop.wait(POLL_INTERVAL)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+
+def _check_chart(interval, short_window, long_window, source):
+    if interval not in INTERVAL_SECONDS:
+        raise ValueError(f'Unsupported interval: {interval}')
+    indicators.check_windows(short_window, long_window)
+    if source not in technicals.SOURCES:
+        raise ValueError(f'Unknown signal source: {source}')
+
+
+def check(ticker, interval, short_window, long_window, source='ema'):
+    """Raise ValueError unless the chart can be streamed: valid settings and a ticker with price history.
+
+    Blocking (it may fetch the daily history); call it before subscribe.
+    """
+    _check_chart(interval, short_window, long_window, source)
+    if not price_cache.refresh(ticker):
+        raise ValueError(f'No price history for {ticker.upper()}')
+
+
+def subscribe(ticker, interval, first_ts, since, short_window, long_window, source='ema'):
+    """Subscribe the calling event loop to new bars of a chart; returns the Subscription.
+
+    Raises RuntimeError when MAX_FEEDS other charts are already being polled.
+    """
+    ticker = ticker.upper()
+    _check_chart(interval, short_window, long_window, source)
+    sub = Subscription(first_ts, since, short_window, long_window, source, asyncio.get_running_loop())
+    with _feeds_lock:
+        feed = _feeds.get((ticker, interval))
+        if feed is None:
+            if len(_feeds) >= MAX_FEEDS:
+                raise RuntimeError(f'At most {MAX_FEEDS} live charts can be streamed at once')
+            feed = _feeds[(ticker, interval)] = Feed(ticker, interval)
+            feed.start()
+        with feed._lock:
+            feed.subscribers.add(sub)
+    return sub
+
+
+def unsubscribe(ticker, interval, sub):
+    # The feed stops polling when its last subscriber leaves
+    ticker = ticker.upper()
+    with _feeds_lock:
+        feed = _feeds.get((ticker, interval))
+        if feed is None:
+            return
+        with feed._lock:
+            feed.subscribers.discard(sub)
+            idle = not feed.subscribers
+        if idle:
+            feed.stop()
+            del _feeds[(ticker, interval)]
+
+
+def stop():
+    with _feeds_lock:
+        for feed in _feeds.values():
+            feed.stop()
+        _feeds.clear()
+
+
+def stats():
+    with _feeds_lock:
+        return {f'{ticker} {interval}': len(feed.subscribers) for (ticker, interval), feed in _feeds.items()}
@@ -1,274 +1,118 @@
 # main.py
+# Routes of the FastAPI app. Only FastAPI and the light modules are imported
+# here; everything that needs pandas, Plotly or Dash is imported by the route
+# that uses it, so a new worker starts serving right away (see startup.py).
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
-import dash
-from dash import dcc, html, Input, Output, State
-import yfinance as yf
-import pandas as pd
-import plotly.graph_objects as go
-import numpy as np
-import threading
-from dash.exceptions import PreventUpdate
-import sqlite3
-from sec_edgar_downloader import Downloader
-import os 
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
+import sys
 from fastapi.staticfiles import StaticFiles
-
-# Initialize the Dash app
-dash_app = dash.Dash(__name__)
-
-# Define the layout of the app
-dash_app.layout = html.Div([
-    html.Div([
-    # Dropdown for selecting the period
-    html.Label('Time Period:'),
-    dcc.Dropdown(
-        id='period-dropdown',
-        options=[
-            {'label': '5 days', 'value': '5d'},
-            {'label': '1 month', 'value': '1mo'},
-            {'label': '3 months', 'value': '3mo'},
-            {'label': '6 months', 'value': '6mo'},
-            {'label': '1 year', 'value': '1y'},
-            {'label': '2 year', 'value': '2y'},
-            {'label': '5 years', 'value': '5y'},
-            {'label': '10 years', 'value': '10y'},
-        ],
-        value='1y'  # default value
-    ),
-
-    # Input for entering the stock ticker
-    html.Div([
-        html.Label('Stock Ticker:'),
-        dcc.Input(
-            id='stock-input',
-            type='text',
-            value= 'AAPL'  # default value
-        )
-    ]),
-
-    # Input for short time window
-    html.Div([
-        html.Label('Short-Term-EMA:'),
-        dcc.Input(
-            id='short-time-window-input',
-            type='number',
-            value=10  # default value
-        )
-    ]),
-
-    # Input for long time window
-    html.Div([
-        html.Label('Long-Term-EMA:'),
-        dcc.Input(
-            id='long-time-window-input',
-            type='number',
-            value=30  # default value
-        )
-    ]),
-
-    # Button for refreshing the data
-    html.Button('Refresh Visual', id='refresh-button', n_clicks=0),
-    ]),
-    # Here's the loading component wrapping the graph
-    dcc.Loading(
-        id="loading",
-        type="circle",
-        children=[dcc.Graph(id='stock-graph',
-                            figure={
-                                'layout': {
-                                    'xaxis': {'visible': False},
-                                    'yaxis': {'visible': False},
-                                    'annotations': [{
-                                        'text': 'Chart is loading...',
-                                        'xref': 'paper',
-                                        'yref': 'paper',
-                                        'showarrow': False,
-                                        'font': {'size': 28}
-                                    }]
-                                }
-                            }
-                        ),
-            ],
-        color="black"
-    ),
-    ])
-
-# Callback for updating the graph when the dropdown selection changes
-@dash_app.callback(
-    Output('stock-graph', 'figure'),
-    [Input('refresh-button', 'n_clicks')],
-    [State('stock-input', 'value'),
-     State('period-dropdown', 'value'),
-     State('short-time-window-input', 'value'),
-     State('long-time-window-input', 'value')])
-
-def update_graph(n_clicks,stock_symbol,selected_period,short_window, long_window):
-    # If the button hasn't been clicked, do not update the graph
-    if n_clicks is None:
-        raise PreventUpdate
-
-    # Fetch the data from yfinance
-    stock_symbol = stock_symbol.upper()
-    ticker_object = yf.Ticker(stock_symbol)
-    stock_df = ticker_object.history(period=selected_period, interval='1d', prepost=True, keepna=False, rounding=2)#.reset_index(drop=False)
-
-    # column names for long and short moving average columns
-    short_window_col = f"{str(short_window)}-EMA"
-    long_window_col = f"{str(long_window)}-EMA"
-
-    # Create a short simple moving average column
-    stock_df[short_window_col] = stock_df['Close'].ewm(span=short_window, adjust=True).mean().round(2)
-
-    # Create a long simple moving average column
-    stock_df[long_window_col] = stock_df['Close'].ewm(span=long_window, adjust=True).mean().round(2)
-
-    # create a new column 'Signal' such that if faster moving average is greater than slower moving average 
-    # then set Signal as 1 else 0.
-    stock_df['Signal'] = 0.0  
-    stock_df['Signal'] = np.where(stock_df[short_window_col] > stock_df[long_window_col], 1.0, 0.0) 
-
-    # create a new column 'Position' which is a day-to-day difference of the 'Signal' column. 
-    stock_df['Position'] = stock_df['Signal'].diff()
-
-    # remove na
-    stock_df = stock_df.fillna(0).drop(columns=['Signal'])
-
-    # Creating the candlestick chart with buy/sell triggers
-    fig = go.Figure(data=[go.Candlestick(x=stock_df.index,
-                open=stock_df['Open'],
-                high=stock_df['High'],
-                low=stock_df['Low'],
-                close=stock_df['Close'],
-                name='Candlestick')])
-
-    fig.add_trace(go.Scatter(x=stock_df.index, y=stock_df['Close'],
-                        mode='lines',
-                        name='Closing $',
-                        line=dict(color='rgba(0, 0, 0, 0.5)')))
-
-    fig.add_trace(go.Scatter(x=stock_df.index, y=stock_df[short_window_col],
-                        mode='lines',
-                        name=short_window_col,
-                        line=dict(color='#CCFFCC')))
-
-    fig.add_trace(go.Scatter(x=stock_df.index, y=stock_df[long_window_col],
-                        mode='lines',
-                        name=long_window_col,
-                        line=dict(color='#FFCCCC')))
-
-    # Add 'buy' signals
-    buy_signals = stock_df[stock_df['Position'] == 1]
-    fig.add_trace(go.Scatter(x=buy_signals.index, y=buy_signals[short_window_col],
-                        mode='markers',
-                        marker_symbol='triangle-up',
-                        marker_size=15, marker_color='#006400',
-                        name='Buy Signal'))
-
-    # Add 'sell' signals
-    sell_signals = stock_df[stock_df['Position'] == -1]
-    fig.add_trace(go.Scatter(x=sell_signals.index, y=sell_signals[short_window_col],
-                        mode='markers',
-                        marker_symbol='triangle-down',
-                        marker_size=15, marker_color='#8B0000',
-                        name='Sell Signal'))
-
-    # Adding shapes and annotations for stock split
-    for date, row in stock_df.iterrows():
-        if row['Stock Splits'] != 0:
-            # Add a vertical line (rectangle) for the stock split dates
-            fig.add_shape(go.layout.Shape(type="line",x0=date,y0=0,
-                        x1=date, y1=1, yref='paper',line=dict(color="black",width=1,)))
-
-            # Add annotation for the stock split ratio
-            fig.add_annotation(x=date,y=0.95,yref='paper',
-                              text=f"Stock Split: 1:{int(row['Stock Splits'])}",
-                              showarrow=False,font=dict(color="black",size=10),
-                              bgcolor="white",opacity=0.7)
-
-    # Add a text card below the X axis title
-    if stock_df[stock_df['Position'] != 0.0].iloc[-1]['Position'] == 1.0:
-        suggestion = 'Buy'
-    elif stock_df[stock_df['Position'] != 0.0].iloc[-1]['Position'] == -1.0:
-        suggestion = 'Sell'
-
-    fig.add_annotation(
-        x=0.5,  # Positioning in the middle of the X axis
-        y=-0.25,  # Positioning below the X axis
-        text=f"Suggestion: {suggestion}",  # The text you want to display
-        showarrow=False,
-        font=dict(
-            size=10,
-            color="black"
-        ),
-        align="center",
-        bgcolor="white",
-        bordercolor="black",
-        borderwidth=1,
-        borderpad=2,
-        xref="paper",  # Reference to the entire paper for positioning
-        yref="paper"   # Reference to the entire paper for positioning
-    )
-
-    # Customizing the layout
-    fig.update_layout(
-        title=f"{stock_symbol} Candlestick Plot with Exponential Moving Average Crossover",
-        xaxis_rangeslider_visible=False,  # Hide the range slider at the bottom
-        xaxis_title='Date',
-        yaxis_title='Price in $',
-        template='plotly_white')
-
-    # Connect to SQLite database (or create it if it doesn't exist)
-    conn = sqlite3.connect('ticker.db')
-
-    # Create a cursor object
-    cursor = conn.cursor()
-
-    # Create a table (if it doesn't already exist)
-    cursor.execute(f'''CREATE TABLE IF NOT EXISTS my_table (ticker TEXT)''')
-
-    # Insert a row of data
-    cursor.execute(f"INSERT INTO my_table (ticker) VALUES (?)", (stock_symbol,))
-
-    # Save (commit) the changes
-    conn.commit()
-
-    # Close the connection
-    conn.close()
-    dash_app.layout['stock-input'].value = stock_symbol
-    return fig
-
-# Function to run the Dash app
-def run_dash(dash_app):
-    dash_app.run_server(port=8050)
-
-def sqlite_ticker():
-    conn = sqlite3.connect('ticker.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT ticker FROM my_table")
-    results = cursor.fetchall()
-    ticker = results[-1][0]
-    conn.close()
-    return ticker
-
-# Create a thread for the Dash app
-dash_thread = threading.Thread(target=run_dash, args=(dash_app,))
-dash_thread.start()
-app = FastAPI()
+from a2wsgi import WSGIMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+import data_access
+import filings
+import filing_search
+import sessions
+import figure_cache
+import startup
+import asyncio
+import json
+import metrics
+import profiling
+import time
+from contextlib import asynccontextmanager
+from pydantic import BaseModel
+
+# The Dash app is served by FastAPI under DASH_PATH (see the mount below)
+DASH_PATH = '/dash/'
+
+# Built on the first request to DASH_PATH, or by the warm-up
+def build_dash_app():
+    import chart
+    return chart.create_app(DASH_PATH).server
+
+dash_server = startup.LazyWSGI(build_dash_app)
+
+# Ticker last charted in the session of a FastAPI request
+def session_ticker(request):
+    with metrics.stage('session_load'):
+        return sessions.load(request.state.session_id)['ticker']
+
+# Size of the chunks a filing is streamed in
+FILING_CHUNK_SIZE = 64 * 1024
+
+# Page header, the filing HTML read chunk by chunk from `file` (opened by the
+# route, so a missing filing is still an error page), then the footer
+async def stream_filing(header, file, footer):
+    try:
+        yield header.encode()
+        with metrics.stage('filing_stream'):
+            while chunk := await data_access.run_blocking(file.read, FILING_CHUNK_SIZE):
+                yield chunk
+        yield footer.encode()
+    finally:
+        file.close()
+
+# Background services start with the worker; the pandas-based ones, and the
+# warm-up when STOCKS_WARMUP is set, in a thread so startup does not wait for them
+services = startup.Services(preload=[dash_server.load])
+
+@asynccontextmanager
+async def lifespan(app):
+    services.start()
+    yield
+    services.stop()
+
+app = FastAPI(lifespan=lifespan)
+
+# Every visitor gets a session cookie, from this layer only; its state lives in the shared session store
+@app.middleware("http")
+async def session_cookie(request: Request, call_next):
+    session_id = request.cookies.get(sessions.COOKIE_NAME)
+    request.state.session_id = session_id or sessions.new_session_id()
+    # The mounted Dash app reads it from its WSGI environ (see chart.dash_session_id)
+    request.scope[sessions.SCOPE_KEY] = request.state.session_id
+    response = await call_next(request)
+    if session_id is None:
+        response.set_cookie(sessions.COOKIE_NAME, request.state.session_id, max_age=sessions.SESSION_TTL,
+                            httponly=True, samesite='lax')
+    return response
+
+# Route template of a request, so metrics have one series per route rather than per URL
+def route_label(request):
+    route = request.scope.get('route')
+    if request.url.path.startswith(DASH_PATH):
+        return request.url.path if request.url.path.endswith('_dash-update-component') else DASH_PATH + '*'
+    return getattr(route, 'path', 'unmatched')
+
+# Every request is timed for /metrics; slow ones are profiled when STOCKS_PROFILE_SLOW_MS is set
+@app.middleware("http")
+async def time_request(request: Request, call_next):
+    samples = profiling.begin()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        route = route_label(request)
+        metrics.request_seconds.observe(elapsed, method=request.method, route=route, status=status)
+        if samples is not None:
+            await data_access.run_blocking(profiling.end, samples, f'{request.method} {route}', elapsed * 1000)
+
+# Responses (chart figures included) are gzip-compressed for clients that accept it; level 5
+# compresses within about 10% of the default level 9 in a twentieth of the time on large bodies
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
+app.mount("/sec-edgar-filings", StaticFiles(directory=filings.FILING_DIR, check_dir=False), name="sec-edgar-filings")
+# Dash's Flask server runs inside every FastAPI worker instead of on its own port
+app.mount(DASH_PATH.rstrip('/'), WSGIMiddleware(dash_server), name="dash")
 
 # format and stock visual in landing page
 @app.get("/", response_class=HTMLResponse)
 async def read_items():
-    ticker = sqlite_ticker()
-    dash_app.layout['stock-input'].value = ticker
-
-    if ticker == None:
-        ticker = 'AAPL'
-        dash_app.layout['stock-input'].value = ticker
-        
-    # Assuming the Dash app is running on port 8050
-    dash_app_url = "http://localhost:8050"
+    # The Dash app is mounted on this server, so a relative URL works behind any host or proxy
+    dash_app_url = DASH_PATH
     return f"""
     <html>
         <head>
@@ -330,14 +174,256 @@ async def read_items():
             <form action="/10q" method="get">
                 <button type="submit">10-Q Report</button>
             </form>
+
+            <form action="/backtest" method="get">
+                <button type="submit">EMA Backtest</button>
+            </form>
+
+            <form action="{dash_app_url}portfolio" method="get">
+                <button type="submit">Portfolio</button>
+            </form>
         </body>
     </html>
     """
     
+# Stats of a lazily imported module, None until it is loaded (or while another thread is importing it)
+def loaded_stats(name):
+    stats = getattr(sys.modules.get(name), 'stats', None)
+    return stats() if stats is not None else None
+
+@app.get("/stats")
+async def get_stats():
+    return {'price_cache': loaded_stats('price_cache'), 'render': loaded_stats('rendering'),
+            'figure_cache': figure_cache.stats(), 'live_subscribers': loaded_stats('live') or {},
+            'startup': services.stats()}
+
+# Server-sent events with the new completed bars of a chart, one 'bars' event per poll that found some
+@app.get("/live/stream")
+async def live_stream(request: Request, ticker: str, interval: str, first_ts: int, since: int,
+                      short: int, long: int, source: str = 'ema'):
+    import live
+    try:
+        await data_access.run_blocking(live.check, ticker, interval, short, long, source)
+        sub = live.subscribe(ticker, interval, first_ts, since, short, long, source)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Comment line, keeps proxies from closing an idle stream
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f'event: bars\ndata: {json.dumps(event)}\n\n'
+        finally:
+            live.unsubscribe(ticker, interval, sub)
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+# Cache counters, added to every /metrics scrape; a scrape never loads pandas by itself
+@metrics.register
+def cache_metrics():
+    prices, figures = loaded_stats('price_cache'), figure_cache.stats()
+    render = loaded_stats('rendering') or {'figures': 0, 'payload_bytes': 0}
+    if prices is not None:
+        yield ('stocks_price_cache_lookups_total', 'counter', 'Price cache lookups by result.',
+               [({'result': result}, prices[result]) for result in ('hits', 'misses', 'tail_fetches', 'reloads')])
+    yield ('stocks_figure_cache_lookups_total', 'counter', 'Figure cache lookups by result.',
+           [({'result': result}, figures[result]) for result in ('memory_hits', 'disk_hits', 'misses')])
+    yield ('stocks_figure_cache_evictions_total', 'counter', 'Figures evicted from the figure cache.',
+           [({}, figures['evictions'])])
+    yield ('stocks_figure_cache_memory_bytes', 'gauge', 'Size of the in-memory figure cache.',
+           [({}, figures['memory_bytes'])])
+    yield ('stocks_figures_rendered_total', 'counter', 'Figures built by update_graph.',
+           [({}, render['figures'])])
+    yield ('stocks_figure_payload_bytes_total', 'counter', 'Bytes of chart figures sent, before gzip.',
+           [({}, render['payload_bytes'])])
+
+# Prometheus scrape endpoint; every worker reports its own numbers
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(metrics.expose(), media_type='text/plain; version=0.0.4')
+
+# queue, last run and next run of the pre-open prefetch of hot tickers
+@app.get("/prefetch")
+async def get_prefetch():
+    import prefetch
+    status = await data_access.run_blocking(prefetch.read_status)
+    return {**status, 'tickers': await data_access.run_blocking(prefetch.hot_tickers)}
+
+class ScreenRequest(BaseModel):
+    tickers: list[str]
+    short_window: int = 10
+    long_window: int = 30
+    period: str = '1y'
+
+# current Buy/Sell suggestion for a whole watchlist in one vectorized pass
+@app.post("/screen")
+async def screen_tickers(screen_request: ScreenRequest):
+    import screen
+    try:
+        return await data_access.run_blocking(screen.screen, screen_request.tickers, screen_request.short_window,
+                                              screen_request.long_window, screen_request.period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+class PortfolioRequest(BaseModel):
+    tickers: list[str]
+    weights: list[float] | None = None
+    period: str = '1y'
+    window: int = 63
+    short_window: int = 10
+    long_window: int = 30
+    benchmark: str = 'SPY'
+
+# correlation matrix, rolling beta against the benchmark and combined EMA signal of a basket
+@app.post("/portfolio")
+async def analyze_portfolio(portfolio_request: PortfolioRequest):
+    import portfolio
+    try:
+        data = await data_access.run_blocking(portfolio.analyze, portfolio_request.tickers, portfolio_request.period,
+                                              portfolio_request.window, portfolio_request.short_window,
+                                              portfolio_request.long_window, portfolio_request.benchmark,
+                                              portfolio_request.weights)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # The correlation matrix of a large basket has a million entries, too many for FastAPI's encoder
+    body = await data_access.run_blocking(json.dumps, data, separators=(',', ':'))
+    return Response(body, media_type='application/json')
+
+# Shared by the /api routes: validation, ETag / If-None-Match, Cache-Control and encoding
+async def data_response(request, kind, ticker, period, interval, format, build, *params):
+    import api
+    if interval not in api.INTERVALS:
+        raise HTTPException(status_code=400, detail=f"Unsupported interval: {interval}")
+    try:
+        api.validate(period, interval, *params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    fmt = api.negotiate(format, request.headers.get('accept'))
+    if fmt is None:
+        raise HTTPException(status_code=406, detail=f"Unsupported format: {format}; use one of {', '.join(api.FORMATS)}")
+    ticker = ticker.upper()
+    version = await data_access.run_blocking(api.refresh, ticker, interval)
+    if not version:
+        raise HTTPException(status_code=404, detail=f"No price history for {ticker}")
+
+    tag = api.etag(kind, ticker, period, interval, version, fmt, *params)
+    headers = {'ETag': tag, 'Cache-Control': f'public, max-age={api.max_age()}', 'Vary': 'Accept'}
+    if api.not_modified(request.headers.get('if-none-match'), tag):
+        return Response(status_code=304, headers=headers)
+
+    data = await data_access.run_blocking(build, ticker, period, interval, *params)
+    meta = dict(ticker=ticker, period=period, interval=interval)
+    if kind == 'signal':
+        return Response(json.dumps(data).encode(), media_type=api.FORMATS['json'], headers=headers)
+    if fmt == 'csv':
+        return StreamingResponse(api.iter_csv(data), media_type=api.FORMATS['csv'], headers=headers)
+    if fmt == 'arrow':
+        try:
+            content = await data_access.run_blocking(api.to_arrow, data, **meta)
+        except RuntimeError as e:
+            raise HTTPException(status_code=406, detail=str(e))
+        return Response(content, media_type=api.FORMATS['arrow'], headers=headers)
+    return Response(api.to_json(data, **meta), media_type=api.FORMATS['json'], headers=headers)
+
+# OHLCV, dividends and splits
+@app.get("/api/prices/{ticker}")
+async def api_prices(request: Request, ticker: str, period: str = '1y', interval: str = '1d', format: str = None):
+    import api
+    return await data_response(request, 'prices', ticker, period, interval, format, api.prices)
+
+# closing price, short/long EMAs and crossover positions (1 buy, -1 sell) as drawn on the chart
+@app.get("/api/ema/{ticker}")
+async def api_ema(request: Request, ticker: str, period: str = '1y', interval: str = '1d',
+                  short_window: int = 10, long_window: int = 30, format: str = None):
+    import api
+    return await data_response(request, 'ema', ticker, period, interval, format, api.ema, short_window, long_window)
+
+# the chart's Buy/Sell/Hold suggestion and the crossing it comes from
+@app.get("/api/signal/{ticker}")
+async def api_signal(request: Request, ticker: str, period: str = '1y', interval: str = '1d',
+                     short_window: int = 10, long_window: int = 30):
+    import api
+    return await data_response(request, 'signal', ticker, period, interval, 'json', api.signal,
+                               short_window, long_window)
+
+def run_backtest(ticker, period, short_min, short_max, long_min, long_max, source='ema'):
+    import backtest
+    import price_cache
+    try:
+        stock_df = price_cache.get_history(ticker, period, interval='1d')
+        if stock_df.empty:
+            raise HTTPException(status_code=404, detail=f"No price history for {ticker}")
+        if source == 'ema':
+            result = backtest.sweep(stock_df['Close'], range(short_min, short_max + 1), range(long_min, long_max + 1))
+        else:
+            result = backtest.sweep_indicator(stock_df, source)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {'ticker': ticker.upper(), 'period': period, 'source': source, **result}
+
+# returns, drawdown and trade count for every (short, long) EMA pair, or for a
+# grid of parameters of another signal source (see backtest.GRIDS)
+@app.get("/backtest/{ticker}")
+async def get_backtest_json(ticker: str, period: str = '10y', short_min: int = 2, short_max: int = 50,
+                            long_min: int = 10, long_max: int = 100, source: str = 'ema'):
+    return await data_access.run_blocking(run_backtest, ticker, period, short_min, short_max, long_min, long_max, source)
+
+@app.get("/backtest", response_class=HTMLResponse)
+async def get_backtest(request: Request, period: str = '10y', short_min: int = 2, short_max: int = 50,
+                       long_min: int = 10, long_max: int = 100, source: str = 'ema'):
+    import plotly.graph_objects as go
+    import technicals
+    ticker = await data_access.run_blocking(session_ticker, request)
+    result = await data_access.run_blocking(run_backtest, ticker, period, short_min, short_max, long_min, long_max, source)
+    if source == 'ema':
+        x, y, x_title, y_title, strategy = result['long'], result['short'], 'Long-Term-EMA', 'Short-Term-EMA', 'EMA Crossover'
+    else:
+        parameters = result['parameters'] + [''] * (2 - len(result['parameters']))
+        x, y, y_title, x_title = result['columns'], result['rows'], *parameters
+        strategy = technicals.LABELS[source]
+    total_return = [[None if v is None else round(v * 100, 2) for v in row] for row in result['total_return']]
+
+    fig = go.Figure(data=go.Heatmap(z=total_return, x=x, y=y,
+                                    customdata=result['trades'], colorscale='RdYlGn', zmid=0,
+                                    colorbar=dict(title='Return %'),
+                                    hovertemplate=f'{y_title} %{{y}} / {x_title} %{{x}}<br>Return %{{z}}%<br>Trades %{{customdata}}<extra></extra>'))
+    fig.update_layout(
+        title=f"{result['ticker']} {strategy} Total Return ({period}, buy & hold {result['buy_and_hold'] * 100:.2f}%)",
+        xaxis_title=x_title,
+        yaxis_title=y_title,
+        template='plotly_white')
+
+    html_content = f'''
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <title>EMA Backtest</title>
+            <style>
+                body {{
+                    background-color: #f2f2f2;
+                    font-family: Arial, sans-serif;
+                }}
+            </style>
+        </head>
+        <body>
+            {fig.to_html(full_html=False, include_plotlyjs='cdn')}
+            <form action="/" method="get">
+                <button type="submit">Visual Page</button>
+            </form>
+        </body>
+        </html>
+        '''
+    return HTMLResponse(content=html_content)
+
 @app.get("/explanation", response_class=HTMLResponse)
 async def get_explanation(request: Request):
-    ticker = sqlite_ticker()
-    dash_app.layout['stock-input'].value = ticker
     try:
         # Construct the final HTML
         html_content = '''
@@ -428,28 +514,26 @@ async def get_explanation(request: Request):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Full-text search over every downloaded filing, best matching items first
+@app.get("/filings/search")
+async def search_filings(q: str, ticker: str = None, form: str = None, section: str = None, limit: int = 20):
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Empty query")
+    results = await data_access.run_blocking(filing_search.search, q, ticker, form, section, limit)
+    return {'query': q, 'results': results}
+
 @app.get("/10k", response_class=HTMLResponse)
 async def get_10k(request: Request):
     #forms = ["10-K","10-Q","8-K","DEF 14A","4","S-1","SC 13D","SC 13G","20-F","40-F"]
-    ticker = sqlite_ticker()
-    dash_app.layout['stock-input'].value = ticker
-    dl = Downloader("Ouro Analytics LLC","adames.ouroanalytics.ai",".")
-    app.mount("/sec-edgar-filings", StaticFiles(directory="sec-edgar-filings"), name="sec-edgar-filings")
+    ticker = await data_access.run_blocking(session_ticker, request)
     try:
-        dl.get("10-K", ticker, limit=1, include_amends=True,download_details=True)
-        path = f'sec-edgar-filings/{ticker}/10-K'
-        form_id = os.listdir(path)[0]
-        files = os.listdir(path + '/' + form_id)
-
-        for file in files:
-            if file.endswith('.html'):
-                html_file = file
-
-        file_path = path + '/' + form_id + '/'+ html_file
-        with open(file_path, 'r') as file:
-            external_html_content = file.read()
+        # Served from the filing store; concurrent first requests share one download
+        with metrics.stage('filing_lookup'):
+            file_path = await data_access.coalesce(
+                ('filing', ticker, '10-K'), filings.latest_path, ticker, '10-K')
+            file = await data_access.run_blocking(open, file_path, 'rb')
        
-        html_content = f'''
+        header = f'''
             <!DOCTYPE html>
             <html>
             <head>
@@ -479,10 +563,11 @@ async def get_10k(request: Request):
             <form action="/" method="get">
                 <button type="submit">Visual Page</button>
             </form>
-            {external_html_content}
-            </html>
             '''
-        return HTMLResponse(content=html_content)
+        # The filing itself is streamed from disk in chunks between header and footer
+        return StreamingResponse(stream_filing(header, file, '''
+            </html>
+            '''), media_type='text/html')
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -490,24 +575,15 @@ async def get_10k(request: Request):
 @app.get("/10q", response_class=HTMLResponse)
 async def get_10q(request: Request):
     #forms = ["10-K","10-Q","8-K","DEF 14A","4","S-1","SC 13D","SC 13G","20-F","40-F"]
-    ticker = sqlite_ticker()
-    dash_app.layout['stock-input'].value = ticker
-    dl = Downloader("Ouro Analytics LLC","adames.ouroanalytics.ai",".")
+    ticker = await data_access.run_blocking(session_ticker, request)
     try:
-        dl.get("10-Q", ticker, limit=1, include_amends=True,download_details=True)
-        path = f'sec-edgar-filings/{ticker}/10-Q'
-        form_id = os.listdir(path)[0]
-        files = os.listdir(path + '/' + form_id)
-
-        for file in files:
-            if file.endswith('.html'):
-                html_file = file
-
-        file_path = path + '/' + form_id + '/'+ html_file
-        with open(file_path, 'r') as file:
-            external_html_content = file.read()
+        # Served from the filing store; concurrent first requests share one download
+        with metrics.stage('filing_lookup'):
+            file_path = await data_access.coalesce(
+                ('filing', ticker, '10-Q'), filings.latest_path, ticker, '10-Q')
+            file = await data_access.run_blocking(open, file_path, 'rb')
        
-        html_content = f'''
+        header = f'''
             <!DOCTYPE html>
             <html>
             <head>
@@ -537,70 +613,11 @@ async def get_10q(request: Request):
             <form action="/" method="get">
                 <button type="submit">Visual Page</button>
             </form>
-            {external_html_content}
-            </html>
             '''
-        return HTMLResponse(content=html_content)
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-    
-
-    #forms = ["10-K","10-Q","8-K","DEF 14A","4","S-1","SC 13D","SC 13G","20-F","40-F"]
-    ticker = sqlite_ticker()
-    dash_app.layout['stock-input'].value = ticker
-    dl = Downloader("Ouro Analytics LLC","adames.ouroanalytics.ai",".")
-    try:
-        dl.get("SC 13G", ticker, limit=1, include_amends=True,download_details=True)
-        path = f'sec-edgar-filings/{ticker}/SC 13G'
-        form_id = os.listdir(path)[0]
-        files = os.listdir(path + '/' + form_id)
-
-        for file in files:
-            if file.endswith('.html'):
-                html_file = file
-
-        file_path = path + '/' + form_id + '/'+ html_file
-        with open(file_path, 'r') as file:
-            external_html_content = file.read()
-       
-        html_content = f'''
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <title>SEC SC 13G Report</title>
-                <script src="https://polyfill.io/v3/polyfill.min.js?features=es6"></script>
-                <script id="MathJax-script" async src="https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-mml-chtml.js"></script>
-            </head>
-            <body>
-
-            <h2>Latest SC 13G: {ticker} </h2>
-            
-            <style>
-                .button-link {{
-                    padding: 10px 20px; /* Adjust as needed */
-                    font-size: 16px; /* Adjust as needed */
-                    background-color: #f2f2f2;
-                    font-family: Arial, sans-serif;
-                    display: flex;
-                    justify-content: center;
-                    align-items: center;
-                    height: 100px;
-                    margin-top: 20px; /* Adjust as needed */
-                }}
-            </style>
-
-            <a href="{file_path}" class="button-link" download>Download SC 13G Report</a>
-
-            <form action="/" method="get">
-                <button type="submit">Visual Page</button>
-            </form>
-
-            {external_html_content}
-
+        # The filing itself is streamed from disk in chunks between header and footer
+        return StreamingResponse(stream_filing(header, file, '''
             </html>
-            '''
-        return HTMLResponse(content=html_content)
+            '''), media_type='text/html')
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
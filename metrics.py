@@ -0,0 +1,104 @@
+# metrics.py
+# Per-stage timings and counters, exposed at /metrics in the Prometheus text format.
+#
+# Code paths time themselves with `with metrics.stage('name'):`, which feeds
+# the stocks_stage_seconds histogram. Other modules' counters (cache hits and
+# misses, render totals) are added at scrape time by collectors registered
+# with register(). Every worker process keeps its own metrics; run Prometheus
+# against each worker (or a single worker) when running several.
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Prometheus histogram with one series per combination of label values."""
+
+    def __init__(self, name, help, labelnames, buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then the sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            series[1] += value
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in sorted(self._series.items())]
+        for key, counts, total in series:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_labels(labels, le=le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(labels)} {total}')
+            lines.append(f'{self.name}_count{_labels(labels)} {cumulative}')
+        return lines
+
+
+def _labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+stage_seconds = Histogram('stocks_stage_seconds', 'Time spent in each stage of a request.', ['stage'])
+request_seconds = Histogram('stocks_request_seconds', 'Time to the response headers, per route.',
+                            ['method', 'route', 'status'])
+
+_collectors = []
+
+
+@contextmanager
+def stage(name):
+    """Time the body of the with block as stage `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=name)
+
+
+def register(collector):
+    """Add `collector` to every scrape.
+
+    collector() returns (name, type, help, samples) tuples, where samples is
+    a list of (labels dict, value) pairs.
+    """
+    _collectors.append(collector)
+    return collector
+
+
+def expose():
+    """All metrics in the Prometheus text exposition format."""
+    lines = stage_seconds.expose() + request_seconds.expose()
+    for collector in _collectors:
+        for name, type_, help, samples in collector():
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {type_}')
+            lines.extend(f'{name}{_labels(labels)} {value}' for labels, value in samples)
+    return '\n'.join(lines) + '\n'
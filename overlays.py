@@ -0,0 +1,69 @@
+# overlays.py
+# Corporate-actions overlay for the price chart: stock splits as vertical lines
+# with a ratio label, dividends as markers under the candles.
+#
+# Split and dividend bars are found with vectorized masks, and the shapes,
+# annotations and dividend trace are plain dicts, so update_graph can add them
+# to the figure in one layout update. Results are cached per ticker and range.
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import rendering
+
+# Overlays kept in memory, one per (ticker, range, rendering mode)
+MAX_ENTRIES = 256
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _build(df, plot_x):
+    x = plot_x(df.index)
+    splits = df['Stock Splits'].to_numpy()
+    split_rows = np.flatnonzero(splits != 0)
+
+    shapes = [
+        dict(type='line', x0=x[i], y0=0, x1=x[i], y1=1, yref='paper', line=dict(color='black', width=1))
+        for i in split_rows
+    ]
+    annotations = [
+        dict(x=x[i], y=0.95, yref='paper', text=f"Stock Split: 1:{int(splits[i])}",
+             showarrow=False, font=dict(color='black', size=10), bgcolor='white', opacity=0.7)
+        for i in split_rows
+    ]
+
+    dividends = df['Dividends'].to_numpy()
+    dividend_rows = np.flatnonzero(dividends != 0)
+    dividend_trace = dict(
+        type='scatter', mode='markers', name='Dividend',
+        x=x[dividend_rows],
+        # Just below the bar's low so the marker does not hide the candle
+        y=rendering.plot_y(df['Low'].to_numpy()[dividend_rows] * 0.97),
+        text=[f"Dividend: ${d:.2f}" for d in dividends[dividend_rows]],
+        hoverinfo='text+x', marker=dict(symbol='diamond', size=8, color='#1F4E9E'),
+    )
+    return shapes, annotations, dividend_trace if len(dividend_rows) else None
+
+
+def corporate_actions(ticker, data_version, df, compact):
+    """(shapes, annotations, dividend trace or None) for the split and dividend bars of `df`.
+
+    `data_version` is the price cache version of the ticker, so the cached
+    overlay is rebuilt whenever new bars are stored.
+    """
+    plot_x = rendering.plot_x if compact else (lambda index: index)
+    stamps = df.index.asi8
+    key = (ticker, data_version, len(df), int(stamps[0]) if len(df) else 0, compact)
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    overlay = _build(df, plot_x)
+    with _lock:
+        _cache[key] = overlay
+        while len(_cache) > MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return overlay
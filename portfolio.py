@@ -0,0 +1,275 @@
+# portfolio.py
+# Basket analysis: correlations between holdings, rolling beta against a
+# benchmark and the combined EMA crossover signal of the holdings.
+#
+# Everything is computed from one (dates x tickers) float32 returns matrix
+# built from the cached histories (see screen.aligned_closes), never from
+# per-ticker DataFrames. The correlation matrix is a handful of matrix
+# products over blocks of columns, and the rolling statistics come from
+# cumulative sums down the columns, so 1,000 tickers over 10 years take
+# a couple of seconds once the histories are in memory.
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import indicators
+import metrics
+import price_cache
+import screen
+
+BENCHMARK = 'SPY'
+
+# Rolling window in bars (about three months of trading days)
+WINDOW = 63
+
+# Most tickers one request may analyze
+MAX_TICKERS = 1000
+
+# Columns processed together; bounds the temporaries to a few (dates x BLOCK_SIZE) arrays
+BLOCK_SIZE = 256
+
+# Bars per year, to annualize volatility
+YEAR = 252
+
+DEFAULT_HOLDINGS = ('AAPL', 'MSFT', 'AMZN', 'GOOGL', 'JPM', 'XOM')
+
+Returns = namedtuple('Returns', ['stamps', 'tickers', 'closes', 'returns'])
+
+Rolling = namedtuple('Rolling', ['covariance', 'correlation', 'beta', 'volatility'])
+
+Portfolio = namedtuple('Portfolio', ['dates', 'tickers', 'weights', 'missing', 'benchmark', 'correlation', 'rolling',
+                                     'combined', 'growth', 'exposure', 'suggestion', 'since'])
+
+
+def returns_matrix(frames):
+    """Daily returns of `frames` ({ticker: DataFrame}) on the union of their dates.
+
+    `returns` is float32 (dates - 1 x tickers), row i holding the return into
+    stamps[i + 1]; it is NaN where a ticker lacks either bar.
+    """
+    stamps, tickers, closes = screen.aligned_closes(frames)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = (closes[1:] / closes[:-1] - 1.0).astype('float32')
+    return Returns(stamps, tickers, closes, returns)
+
+
+def _blocks(n, size):
+    # Consecutive column slices of at most `size` columns
+    return [slice(start, min(start + size, n)) for start in range(0, n, size)]
+
+
+def _moments(count, sum_x, sum_y, sum_xx, sum_yy, sum_xy, min_periods):
+    # Sample covariance, correlation and both variances from raw sums; NaN under min_periods
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dof = np.where(count >= max(min_periods, 2), count - 1.0, np.nan)
+        cov = (sum_xy - sum_x * sum_y / count) / dof
+        var_x = np.maximum((sum_xx - sum_x * sum_x / count) / dof, 0.0)
+        var_y = np.maximum((sum_yy - sum_y * sum_y / count) / dof, 0.0)
+        corr = np.clip(cov / np.sqrt(var_x * var_y), -1.0, 1.0)
+    return cov, corr, var_x, var_y
+
+
+def covariance(returns, min_periods=2, block_size=BLOCK_SIZE):
+    """Pairwise covariance and correlation matrices of the columns of `returns`.
+
+    Like DataFrame.cov/corr, each pair only uses the rows where both columns
+    have a value, and pairs with fewer than `min_periods` such rows are NaN.
+    The sums are matrix products over blocks of `block_size` columns.
+    """
+    valid = ~np.isnan(returns)
+    x = np.where(valid, returns, 0.0).astype('float32')
+    xx = x * x
+    m = valid.astype('float32')
+    n = returns.shape[1]
+    cov = np.full((n, n), np.nan, dtype='float32')
+    corr = np.full((n, n), np.nan, dtype='float32')
+    blocks = _blocks(n, block_size)
+    for i, a in enumerate(blocks):
+        for b in blocks[i:]:
+            # Each sum over the rows where both the `a` and the `b` column have a value
+            count = m[:, a].T @ m[:, b]
+            block_cov, block_corr, _, _ = _moments(
+                count, x[:, a].T @ m[:, b], m[:, a].T @ x[:, b], xx[:, a].T @ m[:, b], m[:, a].T @ xx[:, b],
+                x[:, a].T @ x[:, b], min_periods)
+            cov[a, b], corr[a, b] = block_cov, block_corr
+            cov[b, a], corr[b, a] = block_cov.T, block_corr.T
+    return cov, corr
+
+
+def _rolling_sum(values, window):
+    # Sums over the trailing `window` rows, from one cumulative sum down the columns
+    total = np.cumsum(values, axis=0, dtype='float64')
+    total[window:] -= total[:-window].copy()
+    return total
+
+
+def rolling_against(returns, market, window=WINDOW, min_periods=None, block_size=BLOCK_SIZE):
+    """Rolling covariance, correlation and beta of every column of `returns` against `market`.
+
+    Each statistic at row i covers the trailing `window` rows where both the
+    column and `market` have a value, and is NaN with fewer than
+    `min_periods` of them (half the window by default). Returns float32
+    (rows x columns) arrays; `volatility` is the column's own rolling
+    standard deviation.
+    """
+    if window < 2:
+        raise ValueError('The rolling window must be at least 2 bars')
+    min_periods = window // 2 if min_periods is None else min_periods
+    market = np.asarray(market, dtype='float64')
+    out = Rolling(*(np.full(returns.shape, np.nan, dtype='float32') for _ in Rolling._fields))
+    for cols in _blocks(returns.shape[1], block_size):
+        x = returns[:, cols].astype('float64')
+        valid = ~np.isnan(x) & ~np.isnan(market)[:, None]
+        x = np.where(valid, x, 0.0)
+        y = np.where(valid, market[:, None], 0.0)
+        cov, corr, var_x, var_y = _moments(
+            _rolling_sum(valid, window), _rolling_sum(x, window), _rolling_sum(y, window),
+            _rolling_sum(x * x, window), _rolling_sum(y * y, window), _rolling_sum(x * y, window), min_periods)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            beta = np.where(var_y > 0, cov / var_y, np.nan)
+        out.covariance[:, cols], out.correlation[:, cols] = cov, corr
+        out.beta[:, cols], out.volatility[:, cols] = beta, np.sqrt(var_x)
+    return out
+
+
+def combined_returns(returns, weights):
+    """Returns of holding the columns at `weights`, rebalanced every bar over the columns that have a return."""
+    valid = ~np.isnan(returns)
+    weights = np.asarray(weights, dtype='float64')
+    held = valid @ weights
+    total = np.where(valid, returns, 0.0).astype('float64') @ weights
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(held > 0, total / held, np.nan)
+
+
+def exposure(closes, weights, short_window, long_window):
+    """Combined EMA crossover signal: the weighted share of holdings whose short EMA is above the long one.
+
+    Also returns each holding's last crossing (row and +1/-1, see
+    indicators.last_crossings).
+    """
+    short, long, position = indicators.crossover_matrix(closes, short_window, long_window)
+    listed = ~np.isnan(short)
+    weights = np.asarray(weights, dtype='float64')
+    with np.errstate(invalid='ignore', divide='ignore'):
+        share = ((short > long) @ weights) / (listed @ weights)
+    return share, indicators.last_crossings(position)
+
+
+def _growth(returns):
+    # Value of 1 invested at the first bar, flat over missing returns
+    return np.cumprod(1.0 + np.nan_to_num(returns))
+
+
+def _dates(stamps):
+    # Trading days of nanosecond stamps
+    return pd.to_datetime(stamps, utc=True).tz_convert(price_cache.MARKET_TZ).strftime('%Y-%m-%d').tolist()
+
+
+def build(tickers, period='1y', window=WINDOW, short_window=10, long_window=30, benchmark=BENCHMARK, weights=None):
+    """Correlations, rolling beta and combined EMA signal of a basket of `tickers`.
+
+    `weights` (one per ticker, equal by default) set each holding's share of
+    the combined portfolio and signal. Raises ValueError for a basket it
+    cannot analyze.
+    """
+    tickers = [t.upper() for t in tickers]
+    if not tickers:
+        raise ValueError('No tickers given')
+    if weights is None:
+        weights = [1.0] * len(tickers)
+    if len(weights) != len(tickers):
+        raise ValueError('Give one weight per ticker')
+    if any(w < 0 for w in weights):
+        raise ValueError('Weights must not be negative')
+    weight_of = dict(zip(tickers, weights))
+    if len(weight_of) > MAX_TICKERS:
+        raise ValueError(f'At most {MAX_TICKERS} tickers can be analyzed together')
+    if window < 2:
+        raise ValueError('The rolling window must be at least 2 bars')
+    price_cache.check_period(period)
+    indicators.check_windows(short_window, long_window)
+    benchmark = benchmark.upper()
+
+    with metrics.stage('portfolio_load'):
+        frames, missing = screen.load_histories(list(weight_of) + [benchmark], period)
+    if benchmark not in frames:
+        raise ValueError(f'No price history for the benchmark {benchmark}')
+    holdings = [t for t in weight_of if t in frames]
+    if not holdings:
+        raise ValueError('No price history for any of the tickers')
+    weights = np.array([weight_of[t] for t in holdings], dtype='float64')
+    if weights.sum() <= 0:
+        raise ValueError('Weights must not all be zero')
+
+    with metrics.stage('portfolio_align'):
+        data = returns_matrix(frames)
+        column = {ticker: col for col, ticker in enumerate(data.tickers)}
+        cols = [column[t] for t in holdings]
+        returns = data.returns[:, cols]
+        market = data.returns[:, column[benchmark]]
+
+    with metrics.stage('portfolio_stats'):
+        _, correlation = covariance(returns)
+        rolling = rolling_against(returns, market, window)
+        combined = combined_returns(returns, weights)
+        combined_rolling = rolling_against(combined[:, None], market, window)
+        share, (rows, values) = exposure(data.closes[:, cols], weights, short_window, long_window)
+
+    dates = _dates(data.stamps)
+    return Portfolio(
+        dates=dates[1:],
+        tickers=holdings,
+        weights=weights / weights.sum(),
+        missing=[t for t in missing if t != benchmark],
+        benchmark=benchmark,
+        correlation=correlation,
+        rolling=rolling,
+        combined=combined_rolling,
+        growth=np.column_stack([_growth(combined), _growth(market)]),
+        exposure=share[1:],
+        suggestion=[indicators.suggestion(v) for v in values.tolist()],
+        since=[dates[row] if row >= 0 else None for row in rows.tolist()],
+    )
+
+
+def _json(values, digits=4):
+    # Rounded floats with None for NaN
+    values = np.round(np.asarray(values, dtype='float64'), digits)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def analyze(tickers, period='1y', window=WINDOW, short_window=10, long_window=30, benchmark=BENCHMARK, weights=None):
+    """build() as compact column-oriented JSON.
+
+    Per-holding statistics are those of the last `window` bars; the
+    portfolio's rolling beta, correlation, growth and signal are full series.
+    """
+    result = build(tickers, period, window, short_window, long_window, benchmark, weights)
+    last = {name: values[-1] if len(values) else np.full(len(result.tickers), np.nan)
+            for name, values in result.rolling._asdict().items()}
+    return {
+        'tickers': result.tickers,
+        'missing': result.missing,
+        'benchmark': result.benchmark,
+        'period': period,
+        'window': window,
+        'holdings': {
+            'weight': _json(result.weights),
+            'beta': _json(last['beta']),
+            'correlation': _json(last['correlation']),
+            'volatility': _json(last['volatility'] * np.sqrt(YEAR)),
+            'suggestion': result.suggestion,
+            'since': result.since,
+        },
+        'correlation': _json(result.correlation),
+        'series': {
+            'dates': result.dates,
+            'beta': _json(result.combined.beta[:, 0]),
+            'correlation': _json(result.combined.correlation[:, 0]),
+            'growth': _json(result.growth[:, 0]),
+            'benchmark_growth': _json(result.growth[:, 1]),
+            'exposure': _json(result.exposure),
+        },
+    }
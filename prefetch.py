@@ -0,0 +1,158 @@
+# prefetch.py
+# Warms the price cache and the filing store for the most requested tickers
+# before the market opens, so the first click of the day is a cache hit.
+#
+# Tickers are ranked by how often they appear in the ticker.db request log
+# (my_table) over the last LOOKBACK_DAYS. Only one worker process runs the
+# scheduler (whichever holds prefetch.lock); it writes its progress to
+# STATUS_FILE so /prefetch shows the same status from every worker.
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import filings
+import price_cache
+import storage
+
+TOP_N = int(os.environ.get('STOCKS_PREFETCH_TOP_N', '20'))
+LOOKBACK_DAYS = int(os.environ.get('STOCKS_PREFETCH_LOOKBACK_DAYS', '7'))
+CONCURRENCY = int(os.environ.get('STOCKS_PREFETCH_CONCURRENCY', '4'))
+# Upstream (Yahoo / EDGAR) calls per second across all prefetch threads
+RATE_LIMIT = float(os.environ.get('STOCKS_PREFETCH_RATE', '2'))
+# Local market time of the daily run, before the open
+RUN_AT = tuple(int(part) for part in os.environ.get('STOCKS_PREFETCH_AT', '09:00').split(':'))
+
+FORMS = ('10-K', '10-Q')
+LOCK_FILE = 'prefetch.lock'
+STATUS_FILE = 'prefetch-status.json'
+
+
+def hot_tickers(top_n=TOP_N, lookback_days=LOOKBACK_DAYS):
+    """Most requested tickers of the last `lookback_days`, most requested first."""
+    since = time.time() - lookback_days * 24 * 3600
+    with storage.ticker_pool.connection() as conn:
+        rows = conn.execute('''SELECT ticker, COUNT(*) AS requests FROM my_table
+                               WHERE requested_at >= ?
+                               GROUP BY ticker ORDER BY requests DESC, MAX(requested_at) DESC
+                               LIMIT ?''', (since, top_n)).fetchall()
+    return [ticker for ticker, _ in rows]
+
+
+def next_run(now=None):
+    # Next weekday RUN_AT in market time, strictly after `now`
+    now = now or datetime.now(price_cache.MARKET_TZ)
+    run = now.replace(hour=RUN_AT[0], minute=RUN_AT[1], second=0, microsecond=0)
+    while run <= now or run.weekday() >= 5:
+        run += timedelta(days=1)
+    return run
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def read_status():
+    try:
+        with open(STATUS_FILE) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {'queue': [], 'last_run': None, 'next_run': None, 'running': False}
+
+
+class Scheduler:
+    """Daily prefetch of the hot tickers, run by a single leader process."""
+
+    def __init__(self):
+        self.limiter = RateLimiter(RATE_LIMIT)
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock_handle = None
+        self._status_lock = threading.Lock()
+        self.status = {'queue': [], 'last_run': None, 'next_run': None, 'running': False}
+
+    def _save_status(self, **changes):
+        with self._status_lock:
+            self.status.update(changes)
+            tmp_path = f'{STATUS_FILE}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as file:
+                json.dump(self.status, file)
+            os.replace(tmp_path, STATUS_FILE)
+
+    def _prefetch(self, ticker):
+        self.limiter.wait()
+        price_cache.refresh(ticker)
+        for form in FORMS:
+            self.limiter.wait()
+            filings.download(ticker, form)
+
+    def run_once(self):
+        tickers = hot_tickers()
+        started = time.time()
+        self._save_status(queue=list(tickers), running=True)
+        errors = {}
+
+        def job(ticker):
+            try:
+                self._prefetch(ticker)
+            except Exception as e:
+                errors[ticker] = str(e)
+            with self._status_lock:
+                queue = [t for t in self.status['queue'] if t != ticker]
+            self._save_status(queue=queue)
+
+        with ThreadPoolExecutor(CONCURRENCY, thread_name_prefix='prefetch') as pool:
+            list(pool.map(job, tickers))
+
+        self._save_status(running=False, queue=[], last_run={
+            'started': started, 'finished': time.time(), 'tickers': tickers, 'errors': errors})
+
+    def _run(self):
+        while not self._stop.is_set():
+            run_at = next_run()
+            self._save_status(next_run=run_at.isoformat())
+            timeout = (run_at - datetime.now(price_cache.MARKET_TZ)).total_seconds()
+            self._wake.wait(max(timeout, 0))
+            if self._stop.is_set():
+                return
+            self._wake.clear()
+            self.run_once()
+
+    @property
+    def leader(self):
+        return self._lock_handle is not None
+
+    def start(self):
+        self._lock_handle = storage.try_lock(LOCK_FILE)
+        if self._lock_handle is None:
+            return
+        self._thread = threading.Thread(target=self._run, name='prefetch-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._lock_handle is not None:
+            self._lock_handle.close()
+            self._lock_handle = None
+
+
+scheduler = Scheduler()
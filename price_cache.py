@@ -0,0 +1,328 @@
+# price_cache.py
+# Local on-disk cache of OHLCV history sitting in front of the price provider
+# (yf.Ticker.history by default, see providers.py).
+#
+# Every (ticker, interval) pair is stored once as a full BASE_PERIOD series in
+# prices.db (next to ticker.db). Shorter periods are served as slices of that
+# series, and a stale series is brought up to date by fetching only the bars
+# since the last cached one. Yahoo back-adjusts the whole history for splits
+# and dividends, so a tail fetch that shows one replaces the cached series
+# with a full refetch.
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+import metrics
+import providers
+import storage
+
+PRICE_DB = 'prices.db'
+
+# Longest period offered by the period dropdown; anything shorter is a slice of it
+BASE_PERIOD = '10y'
+
+# While the market is open a cached series is refreshed after this many seconds
+INTRADAY_TTL = 300
+
+# Yahoo keeps revising the daily bar for a while after the close
+SETTLE_DELAY = timedelta(minutes=30)
+
+# Series kept in memory per worker (a 10y daily series takes about 150 kB)
+MAX_FRAMES = int(os.environ.get('STOCKS_PRICE_CACHE_FRAMES', '512'))
+
+# Relative change in a settled bar's close that means Yahoo re-adjusted the history
+ADJUSTMENT_TOLERANCE = 1e-4
+
+MARKET_TZ = ZoneInfo('America/New_York')
+MARKET_OPEN = (9, 30)
+MARKET_CLOSE = (16, 0)
+
+_PERIOD = re.compile(r'([1-9][0-9]*)(d|mo|y)')
+
+# Months in a period of each unit; 'Nd' is N bars, about 21 to a month
+_MONTHS = {'d': 12 / 252, 'mo': 1, 'y': 12}
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Dividends', 'Stock Splits']
+_DB_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'dividends', 'splits']
+
+_stats = {'hits': 0, 'misses': 0, 'tail_fetches': 0, 'reloads': 0}
+_stats_lock = threading.Lock()
+
+# Most recently read frame per (ticker, interval), tagged with its version, for
+# the MAX_FRAMES series used last
+_frames = OrderedDict()
+_frames_lock = threading.Lock()
+_key_locks = {}
+_key_locks_guard = threading.Lock()
+
+
+def _create_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS bars (
+                        ticker TEXT NOT NULL,
+                        interval TEXT NOT NULL,
+                        ts INTEGER NOT NULL,
+                        open REAL, high REAL, low REAL, close REAL,
+                        volume REAL, dividends REAL, splits REAL,
+                        PRIMARY KEY (ticker, interval, ts)) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS series (
+                        ticker TEXT NOT NULL,
+                        interval TEXT NOT NULL,
+                        tz TEXT NOT NULL,
+                        fetched_at REAL NOT NULL,
+                        version INTEGER NOT NULL,
+                        PRIMARY KEY (ticker, interval))''')
+
+
+_pool = storage.ConnectionPool(PRICE_DB, setup=_create_tables)
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _key_lock(key):
+    with _key_locks_guard:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def _last_close(now):
+    # Most recent weekday session close at or before `now` (exchange holidays are ignored)
+    day = now.date()
+    while True:
+        close = datetime(day.year, day.month, day.day, *MARKET_CLOSE, tzinfo=MARKET_TZ)
+        if day.weekday() < 5 and close <= now:
+            return close
+        day -= timedelta(days=1)
+
+
+def _market_open(now):
+    if now.weekday() >= 5:
+        return False
+    return MARKET_OPEN <= (now.hour, now.minute) < MARKET_CLOSE
+
+
+def market_open(now=None):
+    """Whether the regular session is open at `now` (default: the current time)."""
+    return _market_open(now or datetime.now(MARKET_TZ))
+
+
+def is_fresh(fetched_at, now=None, ttl=INTRADAY_TTL):
+    """Whether a series fetched at `fetched_at` (epoch seconds) can be served as is.
+
+    While the market is open (or the last session has not settled), that is
+    for `ttl` seconds.
+    """
+    now = now or datetime.now(MARKET_TZ)
+    settled = _last_close(now) + SETTLE_DELAY
+    if _market_open(now) or now < settled:
+        return now.timestamp() - fetched_at < ttl
+    # Outside market hours nothing changes once the last session has settled
+    return fetched_at >= settled.timestamp()
+
+
+def _fetch(ticker, interval, **kwargs):
+    with metrics.stage('price_fetch'):
+        return providers.price_provider().history(ticker, interval, **kwargs)
+
+
+def _start(last, period):
+    # Calendar start of a months or years `period` ending at the bar `last`; bars after it are in the period
+    if period.endswith('mo'):
+        return last - pd.DateOffset(months=int(period[:-2]))
+    return last - pd.DateOffset(years=int(period[:-1]))
+
+
+def _store(conn, ticker, interval, df, fetched_at):
+    rows = [
+        (ticker, interval, int(ts.timestamp()), *values)
+        for ts, values in zip(df.index, df.reindex(columns=COLUMNS).fillna(0).itertuples(index=False, name=None))
+    ]
+    conn.executemany(f'''INSERT OR REPLACE INTO bars (ticker, interval, ts, {", ".join(_DB_COLUMNS)})
+                         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+    # Tail fetches only append: drop what has aged out of BASE_PERIOD
+    conn.execute('DELETE FROM bars WHERE ticker = ? AND interval = ? AND ts <= ?',
+                 (ticker, interval, int(_start(df.index[-1], BASE_PERIOD).timestamp())))
+    conn.execute('''INSERT INTO series (ticker, interval, tz, fetched_at, version) VALUES (?, ?, ?, ?, 1)
+                    ON CONFLICT (ticker, interval) DO UPDATE SET
+                        fetched_at = excluded.fetched_at, version = version + 1''',
+                 (ticker, interval, str(df.index.tz), fetched_at))
+
+
+def _load(ticker, interval, tz, version, conn=None):
+    # The series at `version`, read with `conn` when given (for a consistent snapshot)
+    with _frames_lock:
+        cached = _frames.get((ticker, interval))
+        if cached is not None and cached[0] == version:
+            _frames.move_to_end((ticker, interval))
+            return cached[1]
+
+    if conn is None:
+        with _pool.connection() as conn:
+            return _load(ticker, interval, tz, version, conn)
+    df = pd.read_sql_query(f'''SELECT ts, {", ".join(_DB_COLUMNS)} FROM bars
+                               WHERE ticker = ? AND interval = ? ORDER BY ts''',
+                           conn, params=(ticker, interval))
+    index = pd.to_datetime(df.pop('ts'), unit='s', utc=True).dt.tz_convert(tz)
+    df.index = pd.DatetimeIndex(index, name='Date')
+    df.columns = COLUMNS
+    with _frames_lock:
+        _frames[(ticker, interval)] = (version, df)
+        _frames.move_to_end((ticker, interval))
+        while len(_frames) > MAX_FRAMES:
+            _frames.popitem(last=False)
+    return df
+
+
+def _empty():
+    # History of a ticker without any bars, shaped like a real one
+    return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([], tz=MARKET_TZ, name='Date'), dtype='float64')
+
+
+def check_period(period):
+    """Raise ValueError unless `period` is a number of days, months or years ('5d', '6mo', '1y') within BASE_PERIOD."""
+    match = _PERIOD.fullmatch(period) if isinstance(period, str) else None
+    if match is None:
+        raise ValueError(f'Unsupported period: {period}; use a number of days, months or years, e.g. 5d, 6mo, 1y')
+    base = _PERIOD.fullmatch(BASE_PERIOD)
+    if int(match[1]) * _MONTHS[match[2]] > int(base[1]) * _MONTHS[base[2]]:
+        raise ValueError(f'Unsupported period: {period}; the longest is {BASE_PERIOD}')
+
+
+def _slice(df, period):
+    # Mirror yfinance's period semantics: 'Nd' is the last N bars, months and
+    # years are calendar offsets back from the latest bar
+    if df.empty:
+        return df
+    if period.endswith('d'):
+        return df.iloc[-int(period[:-1]):]
+    if not period.endswith(('mo', 'y')):
+        raise ValueError(f'Unsupported period: {period}')
+    return df[df.index > _start(df.index[-1], period)]
+
+
+def _readjusted(df, last_ts, settled):
+    # Whether a tail fetch shows that Yahoo re-adjusted the whole history: a split
+    # or dividend after the last cached bar, or a new close for a settled cached bar
+    stamps = df.index.as_unit('s').asi8
+    new = stamps > last_ts
+    for column in ('Stock Splits', 'Dividends'):
+        if column in df and (df[column].fillna(0).to_numpy()[new] != 0).any():
+            return True
+    if settled is not None:
+        ts, close = settled
+        match = np.flatnonzero(stamps == ts)
+        if len(match) and not math.isclose(df['Close'].iloc[match[0]], close, rel_tol=ADJUSTMENT_TOLERANCE):
+            return True
+    return False
+
+
+def _refresh(ticker, interval):
+    # Returns (tz, version) for an up-to-date cached series, fetching as little as
+    # possible; no pooled connection is held while waiting on Yahoo
+    with _pool.connection() as conn:
+        row = conn.execute('SELECT tz, fetched_at, version FROM series WHERE ticker = ? AND interval = ?',
+                           (ticker, interval)).fetchone()
+        # The last cached bar and the settled one before it, as (ts, close)
+        tail = conn.execute('SELECT ts, close FROM bars WHERE ticker = ? AND interval = ? ORDER BY ts DESC LIMIT 2',
+                            (ticker, interval)).fetchall() if row is not None else []
+    if row is not None and is_fresh(row[1]):
+        _count('hits')
+        return row[0], row[2]
+
+    now = time.time()
+    reload = row is None or not tail
+    if reload:
+        _count('misses')
+        df = _fetch(ticker, interval, period=BASE_PERIOD)
+    else:
+        _count('tail_fetches')
+        # Refetch the last cached bar, it may have been a partial one, and the one
+        # before it, whose close shows whether older bars were re-adjusted
+        last_ts, settled = tail[0][0], tail[1] if len(tail) > 1 else None
+        start = pd.Timestamp(tail[-1][0], unit='s', tz='UTC').tz_convert(row[0]).date()
+        df = _fetch(ticker, interval, start=start)
+        if not df.empty and _readjusted(df, last_ts, settled):
+            # A split or dividend rescales every older bar: the cached ones are stale
+            _count('reloads')
+            df = _fetch(ticker, interval, period=BASE_PERIOD)
+            reload = True
+
+    with _pool.connection() as conn:
+        if df.empty:
+            if row is None:
+                return None, None
+            conn.execute('UPDATE series SET fetched_at = ? WHERE ticker = ? AND interval = ?',
+                         (now, ticker, interval))
+            return row[0], row[2]
+
+        if reload:
+            conn.execute('DELETE FROM bars WHERE ticker = ? AND interval = ?', (ticker, interval))
+        _store(conn, ticker, interval, df, now)
+        return conn.execute('SELECT tz, version FROM series WHERE ticker = ? AND interval = ?',
+                            (ticker, interval)).fetchone()
+
+
+def get_history(ticker, period, interval='1d'):
+    """Cached equivalent of yf.Ticker(ticker).history(period=period, interval=interval, ...).
+
+    Returns a fresh DataFrame the caller is free to modify.
+    """
+    check_period(period)
+    ticker = ticker.upper()
+    with _key_lock((ticker, interval)):
+        tz, version = _refresh(ticker, interval)
+        if version is None:
+            return _empty()
+        df = _load(ticker, interval, tz, version)
+    return _slice(df, period).copy()
+
+
+def snapshot(ticker, period, interval='1d'):
+    """(history, version) of the cached series as stored now, without bringing it up to date.
+
+    For callers that have just called refresh(): the returned frame is
+    exactly the data of the returned version, and the lookup is not counted
+    a second time in stats().
+    """
+    check_period(period)
+    ticker = ticker.upper()
+    with _key_lock((ticker, interval)):
+        with _pool.connection() as conn:
+            # One read transaction for the version and its bars, whatever other workers write
+            conn.execute('BEGIN')
+            row = conn.execute('SELECT tz, version FROM series WHERE ticker = ? AND interval = ?',
+                               (ticker, interval)).fetchone()
+            if row is None:
+                return _empty(), 0
+            df = _load(ticker, interval, *row, conn)
+    return _slice(df, period).copy(), row[1]
+
+
+def refresh(ticker, interval='1d'):
+    """Bring the cached series up to date and return its version (0 when there is no data)."""
+    ticker = ticker.upper()
+    with _key_lock((ticker, interval)):
+        _, version = _refresh(ticker, interval)
+    return version or 0
+
+
+def data_version(ticker, interval='1d'):
+    """Version counter of the cached series, bumped every time new bars are stored."""
+    with _pool.connection() as conn:
+        row = conn.execute('SELECT version FROM series WHERE ticker = ? AND interval = ?',
+                           (ticker.upper(), interval)).fetchone()
+    return row[0] if row else 0
+
+
+def stats():
+    with _stats_lock, _frames_lock:
+        return dict(_stats, cached_series=len(_frames))
@@ -0,0 +1,97 @@
+# profiling.py
+# Opt-in sampling profiler for slow requests.
+#
+# With STOCKS_PROFILE_SLOW_MS set, the stacks of every thread of the worker
+# are sampled every STOCKS_PROFILE_INTERVAL_MS while a request is in flight.
+# When the request took longer than the threshold, its samples are written
+# to STOCKS_PROFILE_DIR as a folded-stack file ("thread;frame;frame count"
+# per line) that flamegraph.pl, speedscope or inferno turn into a flame graph.
+# Requests that overlap share the samples taken while they overlap.
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+SLOW_MS = float(os.environ['STOCKS_PROFILE_SLOW_MS']) if os.environ.get('STOCKS_PROFILE_SLOW_MS') else None
+INTERVAL = float(os.environ.get('STOCKS_PROFILE_INTERVAL_MS', '5')) / 1000
+PROFILE_DIR = os.environ.get('STOCKS_PROFILE_DIR', 'profiles')
+
+# Innermost frames of threads that are waiting for work rather than doing any
+IDLE_FRAMES = {'wait', 'select', 'poll', 'accept', '_worker', '_wait_for_tstate_lock'}
+
+enabled = SLOW_MS is not None
+
+
+def _fold(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SamplingProfiler:
+    """One sampler thread that runs while at least one session is open."""
+
+    def __init__(self, interval=INTERVAL):
+        self.interval = interval
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def begin(self):
+        samples = Counter()
+        with self._lock:
+            self._sessions[id(samples)] = samples
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self._thread.start()
+        return samples
+
+    def end(self, samples):
+        with self._lock:
+            self._sessions.pop(id(samples), None)
+        return samples
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = [
+                f'{names.get(ident, ident)};{_fold(frame)}'
+                for ident, frame in sys._current_frames().items()
+                if ident != me and frame.f_code.co_name not in IDLE_FRAMES
+            ]
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    return
+                for samples in self._sessions.values():
+                    samples.update(stacks)
+            time.sleep(self.interval)
+
+
+profiler = SamplingProfiler()
+
+
+def begin():
+    """Start collecting samples for a request; None when profiling is off."""
+    return profiler.begin() if enabled else None
+
+
+def end(samples, name, elapsed_ms):
+    """Stop collecting, and save the samples when the request was slow. Returns the file written, if any."""
+    if samples is None:
+        return None
+    profiler.end(samples)
+    if elapsed_ms < SLOW_MS or not samples:
+        return None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_') or 'root'
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{int(elapsed_ms)}ms-{slug}.folded")
+    with open(path, 'w') as file:
+        file.writelines(f'{stack} {count}\n' for stack, count in samples.items())
+    return path
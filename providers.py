@@ -0,0 +1,204 @@
+# providers.py
+# Where price history and SEC filings come from.
+#
+# The live providers wrap yfinance and sec_edgar_downloader. The local
+# provider serves recorded or synthetic data from disk with a configurable
+# delay, for reproducible load tests and offline CI:
+#
+#   STOCKS_PROVIDER=local STOCKS_FIXTURE_DIR=fixtures STOCKS_PROVIDER_LATENCY_MS=50 uvicorn main:app
+#
+# Recorded prices are read from <fixture dir>/prices/<TICKER>.csv, or
+# <TICKER>_<interval>.csv for intraday intervals (see record_prices), and recorded filings from <fixture dir>/filings/<TICKER>/<form>/*.html.
+# Tickers without a recording get a deterministic synthetic series or filing.
+import os
+import shutil
+import time
+import zlib
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+PROVIDER = os.environ.get('STOCKS_PROVIDER', 'live')
+FIXTURE_DIR = os.environ.get('STOCKS_FIXTURE_DIR', 'fixtures')
+LATENCY = float(os.environ.get('STOCKS_PROVIDER_LATENCY_MS', '0')) / 1000
+
+MARKET_TZ = 'America/New_York'
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Dividends', 'Stock Splits']
+
+
+class YFinanceProvider:
+    def history(self, ticker, interval, **kwargs):
+        import yfinance as yf
+        return yf.Ticker(ticker).history(interval=interval, prepost=True, keepna=False, rounding=2, **kwargs)
+
+
+class EdgarProvider:
+    def download(self, ticker, form, filing_dir):
+        from sec_edgar_downloader import Downloader
+        dl = Downloader("Ouro Analytics LLC","adames.ouroanalytics.ai",os.path.dirname(os.path.abspath(filing_dir)))
+        dl.get(form, ticker, limit=1, include_amends=True,download_details=True)
+
+
+def _period_start(end, period):
+    if period.endswith('d'):
+        return end - pd.tseries.offsets.BDay(int(period[:-1]))
+    if period.endswith('mo'):
+        return end - pd.DateOffset(months=int(period[:-2]))
+    if period.endswith('y'):
+        return end - pd.DateOffset(years=int(period[:-1]))
+    raise ValueError(f'Unsupported period: {period}')
+
+
+def synthetic_history(ticker, end=None, origin='2000-01-03'):
+    """Deterministic daily OHLCV random walk for `ticker` from `origin` to `end`.
+
+    The same ticker always gets the same bars, so a series fetched in pieces
+    lines up exactly.
+    """
+    end = pd.Timestamp(end or date.today())
+    index = pd.bdate_range(origin, end, name='Date').tz_localize(MARKET_TZ)
+    rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+    n = len(index)
+    close = 20 * np.exp(np.cumsum(rng.normal(0.0003, 0.018, n)))
+    open_ = close * np.exp(rng.normal(0, 0.006, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.008, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.008, n)))
+    dividends = np.zeros(n)
+    dividends[63::63] = np.round(close[63::63] * 0.004, 2)
+    df = pd.DataFrame({
+        'Open': open_, 'High': high, 'Low': low, 'Close': close,
+        'Volume': rng.integers(1_000_000, 50_000_000, n).astype('float64'),
+        'Dividends': dividends, 'Stock Splits': np.zeros(n),
+    }, index=index).round(2)
+    return df
+
+
+# Bar length of the intraday intervals the local provider can synthesize
+INTRADAY_MINUTES = {'1m': 1, '2m': 2, '5m': 5, '15m': 15, '30m': 30, '60m': 60, '1h': 60}
+
+
+def synthetic_intraday(ticker, interval, start, end=None):
+    """Deterministic regular-session bars of `ticker` for the weekdays from `start` to `end`.
+
+    Each day is a random walk from that day's synthetic daily open, seeded by
+    ticker, day and interval, so any range of days is reproducible on its own.
+    Bars later than now are left out.
+    """
+    minutes = INTRADAY_MINUTES[interval]
+    daily = synthetic_history(ticker, end)
+    daily = daily[daily.index >= pd.Timestamp(start).tz_localize(MARKET_TZ)]
+    offsets = pd.to_timedelta(np.arange(9 * 60 + 30, 16 * 60, minutes), unit='min')
+    now = pd.Timestamp.now(tz=MARKET_TZ)
+    frames = []
+    for day, open_ in zip(daily.index, daily['Open'].to_numpy()):
+        index = (day + offsets)
+        index = index[index <= now]
+        if len(index) == 0:
+            continue
+        rng = np.random.default_rng(zlib.crc32(f'{ticker}{day:%Y%m%d}{interval}'.encode()))
+        n = len(index)
+        close = open_ * np.exp(np.cumsum(rng.normal(0, 0.0012 * np.sqrt(minutes), n)))
+        bar_open = np.concatenate([[open_], close[:-1]])
+        spread = np.abs(rng.normal(0, 0.0008 * np.sqrt(minutes), n))
+        frames.append(pd.DataFrame({
+            'Open': bar_open, 'High': np.maximum(bar_open, close) * (1 + spread),
+            'Low': np.minimum(bar_open, close) * (1 - spread), 'Close': close,
+            'Volume': rng.integers(1_000, 500_000, n).astype('float64'),
+            'Dividends': np.zeros(n), 'Stock Splits': np.zeros(n),
+        }, index=index.rename('Datetime')))
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([], tz=MARKET_TZ, name='Datetime'))
+    return pd.concat(frames).round(2)
+
+
+class LocalProvider:
+    """Recorded or synthetic prices and filings, served after LATENCY seconds."""
+
+    def __init__(self, fixture_dir=FIXTURE_DIR, latency=LATENCY):
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+
+    def _prices(self, ticker, interval, first_day):
+        # Recorded bars if there are any, else synthetic ones (intraday from `first_day` on)
+        name = f'{ticker}.csv' if interval == '1d' else f'{ticker}_{interval}.csv'
+        path = os.path.join(self.fixture_dir, 'prices', name)
+        if not os.path.exists(path):
+            if interval == '1d':
+                return synthetic_history(ticker)
+            return synthetic_intraday(ticker, interval, first_day)
+        df = pd.read_csv(path, index_col=0)
+        df.index = pd.to_datetime(df.index, utc=True).tz_convert(MARKET_TZ)
+        return df.reindex(columns=COLUMNS, fill_value=0.0)
+
+    def history(self, ticker, interval, period=None, start=None, **kwargs):
+        time.sleep(self.latency)
+        if start is not None:
+            first_day = start
+        elif period not in (None, 'max'):
+            first_day = _period_start(pd.Timestamp(date.today()), period).date()
+        else:
+            first_day = date.today() - pd.DateOffset(years=2)
+        df = self._prices(ticker, interval, first_day)
+        if df.empty:
+            return df
+        if start is not None:
+            return df[df.index >= pd.Timestamp(start).tz_localize(MARKET_TZ)]
+        if period is not None and period != 'max':
+            return df[df.index > _period_start(df.index[-1], period)]
+        return df
+
+    def download(self, ticker, form, filing_dir):
+        time.sleep(self.latency)
+        accession = f'0000000000-{date.today():%y}-{zlib.crc32(f"{ticker}{form}".encode()) % 1000000:06d}'
+        folder = os.path.join(filing_dir, ticker, form, accession)
+        if os.path.exists(folder):
+            return
+        os.makedirs(folder)
+
+        recorded = os.path.join(self.fixture_dir, 'filings', ticker, form)
+        html_files = sorted(f for f in os.listdir(recorded) if f.endswith('.html')) if os.path.isdir(recorded) else []
+        if html_files:
+            shutil.copy(os.path.join(recorded, html_files[-1]), os.path.join(folder, 'primary-document.html'))
+        else:
+            with open(os.path.join(folder, 'primary-document.html'), 'w') as file:
+                file.write(synthetic_filing(ticker, form))
+        with open(os.path.join(folder, 'full-submission.txt'), 'w') as file:
+            file.write(f'<SEC-HEADER>\nCONFORMED SUBMISSION TYPE:\t{form}\nFILED AS OF DATE:\t{date.today():%Y%m%d}\n</SEC-HEADER>\n')
+
+
+def synthetic_filing(ticker, form, paragraphs=2000):
+    # A filing-sized HTML document with the usual item headings
+    items = ['Item 1. Business', 'Item 1A. Risk Factors', "Item 7. Management's Discussion and Analysis",
+             'Item 8. Financial Statements and Supplementary Data']
+    body = []
+    for n, item in enumerate(items):
+        body.append(f'<h2>{item}</h2>')
+        body.extend(f'<p>{ticker} {form} synthetic paragraph {n}.{i}: revenue, risk and operations text.</p>'
+                    for i in range(paragraphs // len(items)))
+    return f'<html><body><h1>{ticker} {form}</h1>{"".join(body)}</body></html>'
+
+
+def record_prices(tickers, fixture_dir=FIXTURE_DIR, period='10y', interval='1d'):
+    """Save live history of `tickers` as CSV fixtures for the local provider."""
+    os.makedirs(os.path.join(fixture_dir, 'prices'), exist_ok=True)
+    for ticker in tickers:
+        ticker = ticker.upper()
+        df = YFinanceProvider().history(ticker, interval, period=period)
+        name = f'{ticker}.csv' if interval == '1d' else f'{ticker}_{interval}.csv'
+        df.reindex(columns=COLUMNS, fill_value=0.0).to_csv(os.path.join(fixture_dir, 'prices', name))
+
+
+_local = LocalProvider()
+_providers = {
+    'live': (YFinanceProvider(), EdgarProvider()),
+    'local': (_local, _local),
+}
+
+
+def price_provider():
+    return _providers[PROVIDER][0]
+
+
+def filing_provider():
+    return _providers[PROVIDER][1]
@@ -0,0 +1,85 @@
+# rendering.py
+# Compact figure payloads for long periods.
+#
+# In compact mode the price frame is aggregated into OHLC buckets so there are
+# no more candles than the plot can show, and every trace is sent as a typed
+# numeric array (float32 prices, float64 epoch-millisecond dates) that
+# plotly.py encodes as base64 instead of lists of floats and date strings.
+import threading
+
+import numpy as np
+
+# Width the chart is drawn at, and the narrowest candle worth drawing
+PLOT_WIDTH_PX = 1200
+PX_PER_CANDLE = 3
+MAX_BUCKETS = PLOT_WIDTH_PX // PX_PER_CANDLE
+
+MODES = ('compact', 'full')
+
+_stats = {'figures': 0, 'bars_in': 0, 'bars_out': 0, 'payload_bytes': 0, 'render_ms': 0.0}
+_stats_lock = threading.Lock()
+
+
+def bucket_starts(n, max_buckets, keep):
+    """Start row of every bucket when `n` rows are reduced to about `max_buckets`.
+
+    Rows in `keep` (e.g. buy/sell and split bars) always get a bucket of
+    their own, so they are drawn exactly where their markers are.
+    """
+    starts = np.linspace(0, n, max_buckets + 1).astype('int64')[:-1]
+    keep = np.asarray(keep, dtype='int64')
+    starts = np.union1d(starts, np.concatenate([keep, keep + 1]))
+    return starts[starts < n]
+
+
+def downsample(df, keep, max_buckets=MAX_BUCKETS):
+    """Aggregate `df` into OHLC buckets: first open, max high, min low, last close.
+
+    Every other column takes the bucket's last value, and each bucket is
+    dated at its last bar so closes and EMAs stay exact at their dates.
+    """
+    if len(df) <= max_buckets:
+        return df
+    starts = bucket_starts(len(df), max_buckets, keep)
+    last = np.append(starts[1:], len(df)) - 1
+
+    out = df.iloc[last].copy()
+    out['Open'] = df['Open'].to_numpy()[starts]
+    out['High'] = np.maximum.reduceat(df['High'].to_numpy(), starts)
+    out['Low'] = np.minimum.reduceat(df['Low'].to_numpy(), starts)
+    if 'Volume' in df:
+        out['Volume'] = np.add.reduceat(df['Volume'].to_numpy(), starts)
+    return out
+
+
+def plot_x(index):
+    # Exchange-local wall time in epoch milliseconds, which a date axis reads
+    # the same way as the date strings it replaces
+    index = index.tz_localize(None) if index.tz is not None else index
+    return index.as_unit('ms').asi8.astype('float64')
+
+
+def plot_y(values):
+    return np.asarray(values, dtype='float32')
+
+
+def record_render(bars_in, bars_out, render_ms):
+    with _stats_lock:
+        _stats['figures'] += 1
+        _stats['bars_in'] += bars_in
+        _stats['bars_out'] += bars_out
+        _stats['render_ms'] += render_ms
+
+
+def record_payload(payload_bytes):
+    # Size of the figure response before gzip
+    with _stats_lock:
+        _stats['payload_bytes'] += payload_bytes
+
+
+def stats():
+    with _stats_lock:
+        figures = _stats['figures'] or 1
+        return dict(_stats,
+                    avg_payload_bytes=round(_stats['payload_bytes'] / figures),
+                    avg_render_ms=round(_stats['render_ms'] / figures, 2))
@@ -0,0 +1,68 @@
+# screen.py
+# Watchlist screening: the current EMA crossover suggestion for many tickers
+# at once, computed on a single (dates x tickers) array.
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import indicators
+import price_cache
+
+# Number of histories loaded from the price cache concurrently
+FETCH_WORKERS = 8
+
+
+def aligned_closes(frames):
+    """Stack the 'Close' columns of `frames` ({ticker: DataFrame}) on the union of their dates.
+
+    Returns (stamps, tickers, closes) where `closes` is a float64
+    (dates x tickers) array holding NaN on dates a ticker has no bar.
+    """
+    tickers = list(frames)
+    if not tickers:
+        return np.empty(0, 'int64'), tickers, np.empty((0, 0))
+    # Every (date, ticker, close) of all histories, scattered into the array in one step
+    lengths = [len(frames[t]) for t in tickers]
+    stamps, rows = np.unique(np.concatenate([frames[t].index.as_unit('ns').asi8 for t in tickers]), return_inverse=True)
+    closes = np.full((len(stamps), len(tickers)), np.nan)
+    closes[rows, np.repeat(np.arange(len(tickers)), lengths)] = np.concatenate(
+        [frames[t]['Close'].to_numpy(dtype='float64') for t in tickers])
+    return stamps, tickers, closes
+
+
+def load_histories(tickers, period):
+    # {ticker: DataFrame} for the tickers with data, plus the list of the ones without
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    with ThreadPoolExecutor(FETCH_WORKERS) as pool:
+        frames = dict(zip(tickers, pool.map(lambda t: price_cache.get_history(t, period), tickers)))
+    missing = [t for t, df in frames.items() if df.empty]
+    return {t: df for t, df in frames.items() if not df.empty}, missing
+
+
+def screen(tickers, short_window, long_window, period='1y'):
+    """Latest crossover suggestion per ticker, as compact column-oriented JSON.
+
+    Raises ValueError for an unsupported period or an EMA window under one bar.
+    """
+    price_cache.check_period(period)
+    indicators.check_windows(short_window, long_window)
+    frames, missing = load_histories(tickers, period)
+    stamps, tickers, closes = aligned_closes(frames)
+    if not tickers:
+        return {'tickers': [], 'suggestion': [], 'since': [], 'close': [], 'missing': missing}
+
+    _, _, position = indicators.crossover_matrix(closes, short_window, long_window)
+    rows, values = indicators.last_crossings(position)
+    dates = [None] * len(tickers)
+    for col, ticker in enumerate(tickers):
+        if rows[col] >= 0:
+            index = frames[ticker].index
+            dates[col] = str(index[np.searchsorted(index.as_unit('ns').asi8, stamps[rows[col]])].date())
+
+    return {
+        'tickers': tickers,
+        'suggestion': [indicators.suggestion(v) for v in values.tolist()],
+        'since': dates,
+        'close': [float(frames[t]['Close'].iloc[-1]) for t in tickers],
+        'missing': missing,
+    }
@@ -0,0 +1,95 @@
+# sessions.py
+# Per-session state (last ticker and chart parameters), keyed by a session
+# cookie and kept in a store every worker process can reach.
+#
+# The default store is the sessions table in ticker.db, shared by all
+# workers on one machine. Setting STOCKS_SESSION_REDIS_URL switches to Redis
+# so workers on several machines see the same sessions.
+import json
+import os
+import secrets
+import time
+
+import storage
+
+COOKIE_NAME = 'stocks_session'
+
+# ASGI scope key the FastAPI middleware stores the request's session under, for the mounted Dash app
+SCOPE_KEY = 'stocks.session_id'
+
+# Sessions idle for longer than this are forgotten
+SESSION_TTL = 30 * 24 * 3600
+
+REDIS_URL = os.environ.get('STOCKS_SESSION_REDIS_URL')
+
+DEFAULTS = {'ticker': 'AAPL', 'period': '1y', 'short_window': 10, 'long_window': 30, 'interval': '1d'}
+
+
+def new_session_id():
+    return secrets.token_urlsafe(24)
+
+
+class SQLiteSessionStore:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def get(self, session_id):
+        with self.pool.connection() as conn:
+            row = conn.execute('''SELECT ticker, period, short_window, long_window, interval FROM sessions
+                                  WHERE session_id = ? AND updated_at > ?''',
+                               (session_id, time.time() - SESSION_TTL)).fetchone()
+        return dict(zip(DEFAULTS, row)) if row else None
+
+    def save(self, session_id, state):
+        with self.pool.connection() as conn:
+            conn.execute('''INSERT OR REPLACE INTO sessions
+                                (session_id, ticker, period, short_window, long_window, interval, updated_at)
+                            VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                         (session_id, state['ticker'], state['period'], state['short_window'],
+                          state['long_window'], state['interval'], time.time()))
+
+
+class RedisSessionStore:
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('STOCKS_SESSION_REDIS_URL is set but the redis package is not installed')
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, session_id):
+        state = self.client.hgetall(f'{COOKIE_NAME}:{session_id}')
+        if not state:
+            return None
+        # Values are stored as JSON; one that does not decode to the default's type
+        # (written before values were JSON-encoded, or by hand) leaves the default
+        values = {}
+        for key in DEFAULTS.keys() & state.keys():
+            try:
+                value = json.loads(state[key])
+            except ValueError:
+                continue
+            if type(value) is type(DEFAULTS[key]):
+                values[key] = value
+        return values
+
+    def save(self, session_id, state):
+        key = f'{COOKIE_NAME}:{session_id}'
+        with self.client.pipeline() as pipe:
+            pipe.hset(key, mapping={k: json.dumps(state[k]) for k in DEFAULTS})
+            pipe.expire(key, SESSION_TTL)
+            pipe.execute()
+
+
+store = RedisSessionStore(REDIS_URL) if REDIS_URL else SQLiteSessionStore(storage.ticker_pool)
+
+
+def load(session_id):
+    """State of `session_id`, or the defaults for a new or unknown session."""
+    state = store.get(session_id) if session_id else None
+    return dict(DEFAULTS, **(state or {}))
+
+
+def save(session_id, **changes):
+    if session_id:
+        store.save(session_id, dict(load(session_id), **changes))
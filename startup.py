@@ -0,0 +1,126 @@
+# startup.py
+# What a worker starts with: the background services, run from the FastAPI
+# lifespan, and the optional warm-up.
+#
+# main.py imports nothing heavier than FastAPI, so a new worker serves its
+# first request within a fraction of a second. Dash, Plotly and pandas load
+# when a request first needs them, or ahead of that in a background thread:
+# the pandas-based services start there, followed by the warm-up when
+# STOCKS_WARMUP is set. The warm-up builds the chart app and renders the
+# default chart of the hot tickers, which fills the price cache, the
+# crossover engine and the figure cache before visitors arrive.
+#
+# benchmarks/importtime.py checks that main.py stays within its import-time
+# budget.
+import os
+import sys
+import threading
+import time
+
+import filing_search
+import filings
+import sessions
+import storage
+
+WARMUP = os.environ.get('STOCKS_WARMUP', '').lower() in ('1', 'true', 'yes')
+
+# Hot tickers whose default chart the warm-up renders
+WARMUP_TICKERS = int(os.environ.get('STOCKS_WARMUP_TICKERS', '5'))
+
+
+class LazyWSGI:
+    """WSGI app built by `factory` on its first request, or earlier by load()."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._app = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._app is None:
+            with self._lock:
+                if self._app is None:
+                    self._app = self.factory()
+        return self._app
+
+    def __call__(self, environ, start_response):
+        return self.load()(environ, start_response)
+
+
+def warm_up(preload=(), tickers=None):
+    """Run the `preload` callables and render the default chart of `tickers` (the hot ones by default)."""
+    import chart
+    import prefetch
+    import technicals
+
+    for load in preload:
+        load()
+    if technicals.numba is not None:
+        # Compile the indicator kernel now rather than in the first request that uses it
+        technicals.compute([1.0] * 2, [1.0] * 2, [1.0] * 2, [1.0] * 2, list(technicals.DEFAULTS))
+
+    defaults = sessions.DEFAULTS
+    if tickers is None:
+        tickers = prefetch.hot_tickers()[:WARMUP_TICKERS] or [defaults['ticker']]
+    warmed = []
+    for ticker in tickers:
+        try:
+            chart.build_figure(ticker.upper(), defaults['period'], defaults['short_window'], defaults['long_window'],
+                               interval=defaults['interval'])
+        except Exception:
+            # An unreachable upstream must not keep the worker from starting
+            continue
+        warmed.append(ticker)
+    return warmed
+
+
+class Services:
+    """The background threads of a worker, from lifespan startup to shutdown."""
+
+    def __init__(self, warmup=WARMUP, preload=()):
+        self.warmup = warmup
+        self.preload = preload
+        self.refresher = filings.Refresher()
+        self.ingester = filing_search.Ingester()
+        self.warmup_seconds = None
+        self._thread = None
+        self._scheduler = None
+
+    def start(self):
+        storage.ticker_log.start()
+        # Newer SEC filings are looked for in the background, never in a request
+        self.refresher.start()
+        # Downloaded filings are indexed for /filings/search as they come in
+        self.ingester.start()
+        self._thread = threading.Thread(target=self._start_background, name='startup', daemon=True)
+        self._thread.start()
+
+    def _start_background(self):
+        # Hot tickers are warmed before the open by one of the workers
+        import prefetch
+        self._scheduler = prefetch.scheduler
+        self._scheduler.start()
+        if self.warmup:
+            started = time.perf_counter()
+            warm_up(self.preload)
+            self.warmup_seconds = round(time.perf_counter() - started, 3)
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.join()
+        # Live feeds only exist if a chart went live, in which case live.py is loaded
+        live = sys.modules.get('live')
+        if live is not None:
+            live.stop()
+        if self._scheduler is not None:
+            self._scheduler.stop()
+        self.ingester.stop()
+        self.refresher.stop()
+        storage.ticker_log.stop()
+
+    def stats(self):
+        return {
+            'warmup': self.warmup,
+            'warmup_seconds': self.warmup_seconds,
+            'loaded': sorted(name for name in ('pandas', 'plotly', 'dash', 'chart') if name in sys.modules),
+        }
@@ -0,0 +1,166 @@
+# storage.py
+# Pooled SQLite connections in WAL mode, and the ticker request log kept in
+# ticker.db (my_table).
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+TICKER_DB = 'ticker.db'
+
+# Connections kept open per database file
+POOL_SIZE = int(os.environ.get('STOCKS_DB_POOL_SIZE', '8'))
+
+# The ticker log is written in batches: every FLUSH_INTERVAL seconds, or as
+# soon as FLUSH_SIZE requests are waiting
+FLUSH_INTERVAL = 1.0
+FLUSH_SIZE = 100
+
+
+def try_lock(path):
+    """Exclusive lock on `path` held until the returned file is closed; None when another process has it."""
+    try:
+        import fcntl
+    except ImportError:
+        # No flock (Windows): every process gets the lock
+        return open(path, 'a')
+    handle = open(path, 'a')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+class ConnectionPool:
+    """A bounded set of reusable connections to one SQLite file.
+
+    `setup(conn)` runs once, on the first connection, to create or migrate
+    the schema.
+    """
+
+    def __init__(self, path, size=POOL_SIZE, setup=None):
+        self.path = path
+        self.setup = setup
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._setup_lock = threading.Lock()
+        self._ready = False
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if not self._ready:
+            with self._setup_lock:
+                if not self._ready:
+                    if self.setup is not None:
+                        self.setup(conn)
+                        conn.commit()
+                    self._ready = True
+        return conn
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._open()
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def migrate_ticker_db(conn):
+    # Schema versions of ticker.db, tracked with PRAGMA user_version:
+    #   0: my_table (ticker TEXT), one row per click, no index
+    #   1: adds requested_at plus indexes for "last ticker" and per-ticker counts
+    #   2: adds the sessions table (see sessions.py)
+    #   3: adds the chart interval to sessions
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version < 1:
+        conn.execute('CREATE TABLE IF NOT EXISTS my_table (ticker TEXT)')
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(my_table)')}
+        if 'requested_at' not in columns:
+            conn.execute('ALTER TABLE my_table ADD COLUMN requested_at REAL')
+        conn.execute('CREATE INDEX IF NOT EXISTS my_table_requested_at ON my_table (requested_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS my_table_ticker ON my_table (ticker, requested_at)')
+        conn.execute('PRAGMA user_version = 1')
+    if version < 2:
+        conn.execute('''CREATE TABLE IF NOT EXISTS sessions (
+                            session_id TEXT PRIMARY KEY,
+                            ticker TEXT NOT NULL,
+                            period TEXT NOT NULL,
+                            short_window INTEGER NOT NULL,
+                            long_window INTEGER NOT NULL,
+                            updated_at REAL NOT NULL)''')
+        conn.execute('PRAGMA user_version = 2')
+    if version < 3:
+        conn.execute("ALTER TABLE sessions ADD COLUMN interval TEXT NOT NULL DEFAULT '1d'")
+        conn.execute('PRAGMA user_version = 3')
+
+
+class TickerLog:
+    """Log of requested tickers with batched inserts."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._pending = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, ticker):
+        with self._lock:
+            self._pending.append((ticker, time.time()))
+            full = len(self._pending) >= FLUSH_SIZE
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if pending:
+            with self.pool.connection() as conn:
+                conn.executemany('INSERT INTO my_table (ticker, requested_at) VALUES (?, ?)', pending)
+
+    def _run(self):
+        while not self._stop.wait(FLUSH_INTERVAL):
+            self.flush()
+
+    def start(self):
+        # The first connection runs the schema migration
+        with self.pool.connection():
+            pass
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='ticker-log-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+
+ticker_pool = ConnectionPool(TICKER_DB, setup=migrate_ticker_db)
+ticker_log = TickerLog(ticker_pool)
@@ -0,0 +1,292 @@
+# technicals.py
+# RSI, MACD, Bollinger bands, ATR and VWAP computed together in one pass.
+#
+# A single loop walks the bars once and advances the state of every
+# requested indicator at each bar, instead of one pandas pass per indicator.
+# The loop is compiled with Numba when that package is installed; otherwise
+# the same function runs on plain Python lists. Results are cached per
+# (series, data version, first bar, length, params), so repeat charts and API
+# calls on unchanged data do no work.
+#
+# Each indicator also defines a long/flat rule, so any of them (or the EMA
+# crossover in indicators.py) can drive the chart's buy/sell markers and the
+# backtester.
+import math
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Maximum number of cached indicator results kept in memory
+MAX_ENTRIES = 512
+
+# Indicator parameters; `band` (RSI) and `multiple` (ATR) only affect the signal rule
+DEFAULTS = {
+    'rsi': {'period': 14, 'band': 30},
+    'macd': {'fast': 12, 'slow': 26, 'signal': 9},
+    'bollinger': {'period': 20, 'width': 2.0},
+    'atr': {'period': 14, 'multiple': 1.0},
+    'vwap': {},
+}
+
+# The parameters above that only the long/flat rule reads
+RULE_PARAMS = {'rsi': ('band',), 'atr': ('multiple',)}
+
+# Output rows of the fused pass
+OUTPUTS = ('rsi', 'macd', 'macd_signal', 'macd_hist', 'bb_mid', 'bb_upper', 'bb_lower', 'atr', 'vwap')
+
+# Output columns of each indicator
+COLUMNS = {
+    'rsi': ('rsi',),
+    'macd': ('macd', 'macd_signal', 'macd_hist'),
+    'bollinger': ('bb_mid', 'bb_upper', 'bb_lower'),
+    'atr': ('atr',),
+    'vwap': ('vwap',),
+}
+
+# What can drive the buy/sell signal: the EMA crossover or any indicator
+SOURCES = ('ema',) + tuple(DEFAULTS)
+
+LABELS = {
+    'ema': 'EMA Crossover',
+    'macd': 'MACD',
+    'rsi': 'RSI',
+    'bollinger': 'Bollinger Bands',
+    'atr': 'ATR Breakout',
+    'vwap': 'VWAP',
+}
+
+Signal = namedtuple('Signal', ['values', 'position', 'last_position'])
+
+
+def _fused(high, low, close, volume, session_start, flags, params, out):
+    # One pass over the bars; `out` rows follow OUTPUTS and stay NaN during warm-up.
+    # Written for both Numba and plain lists, hence the scalar style.
+    n = len(close)
+    rsi_on, macd_on, bb_on, atr_on, vwap_on = flags[0], flags[1], flags[2], flags[3], flags[4]
+    rsi_period, fast, slow, signal_span = params[0], params[1], params[2], params[3]
+    bb_period, bb_width, atr_period = params[4], params[5], params[6]
+    rsi_n, bb_n, atr_n = int(rsi_period), int(bb_period), int(atr_period)
+
+    fast_alpha = 2.0 / (fast + 1.0)
+    slow_alpha = 2.0 / (slow + 1.0)
+    signal_alpha = 2.0 / (signal_span + 1.0)
+    gain_avg = loss_avg = 0.0
+    fast_ema = slow_ema = signal_ema = 0.0
+    window_sum = window_sq = 0.0
+    atr = 0.0
+    cum_pv = cum_volume = 0.0
+    prev_close = close[0]
+
+    for i in range(n):
+        c = close[i]
+
+        if rsi_on and i > 0:
+            change = c - prev_close
+            gain = change if change > 0.0 else 0.0
+            loss = -change if change < 0.0 else 0.0
+            if i <= rsi_n:
+                # Wilder's smoothing starts from the simple average of the first `period` changes
+                gain_avg += gain / rsi_period
+                loss_avg += loss / rsi_period
+            else:
+                gain_avg = (gain_avg * (rsi_period - 1.0) + gain) / rsi_period
+                loss_avg = (loss_avg * (rsi_period - 1.0) + loss) / rsi_period
+            if i >= rsi_n:
+                if loss_avg == 0.0:
+                    out[0][i] = 100.0 if gain_avg > 0.0 else 50.0
+                else:
+                    out[0][i] = 100.0 - 100.0 / (1.0 + gain_avg / loss_avg)
+
+        if macd_on:
+            if i == 0:
+                fast_ema = slow_ema = c
+            else:
+                fast_ema += fast_alpha * (c - fast_ema)
+                slow_ema += slow_alpha * (c - slow_ema)
+            macd = fast_ema - slow_ema
+            signal_ema = macd if i == 0 else signal_ema + signal_alpha * (macd - signal_ema)
+            out[1][i] = macd
+            out[2][i] = signal_ema
+            out[3][i] = macd - signal_ema
+
+        if bb_on:
+            window_sum += c
+            window_sq += c * c
+            if i >= bb_n:
+                old = close[i - bb_n]
+                window_sum -= old
+                window_sq -= old * old
+            if i >= bb_n - 1:
+                mean = window_sum / bb_period
+                variance = window_sq / bb_period - mean * mean
+                std = math.sqrt(variance) if variance > 0.0 else 0.0
+                out[4][i] = mean
+                out[5][i] = mean + bb_width * std
+                out[6][i] = mean - bb_width * std
+
+        if atr_on:
+            h, l = high[i], low[i]
+            true_range = h - l
+            if i > 0:
+                true_range = max(true_range, abs(h - prev_close), abs(l - prev_close))
+            if i < atr_n:
+                atr += true_range / atr_period
+            else:
+                atr = (atr * (atr_period - 1.0) + true_range) / atr_period
+            if i >= atr_n - 1:
+                out[7][i] = atr
+
+        if vwap_on:
+            if session_start[i]:
+                cum_pv = cum_volume = 0.0
+            typical = (high[i] + low[i] + c) / 3.0
+            cum_pv += typical * volume[i]
+            cum_volume += volume[i]
+            out[8][i] = cum_pv / cum_volume if cum_volume > 0.0 else typical
+
+        prev_close = c
+
+
+_kernel = numba.njit(cache=True, nogil=True)(_fused) if numba is not None else _fused
+
+
+def resolve(params=None):
+    """DEFAULTS with the given per-indicator overrides, e.g. {'rsi': {'period': 10}}."""
+    params = params or {}
+    unknown = set(params) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown indicator: {', '.join(sorted(unknown))}")
+    return {name: {**defaults, **params.get(name, {})} for name, defaults in DEFAULTS.items()}
+
+
+def compute(high, low, close, volume, names, params=None, session_start=None):
+    """Columns of the indicators in `names`, from one pass over the bars.
+
+    Bollinger bands use the population standard deviation of the window
+    (ddof=0, i.e. pandas ``rolling().std(ddof=0)``), not the sample one.
+    VWAP restarts at every bar where `session_start` is true (intraday
+    sessions), or accumulates from the first bar when it is None.
+    """
+    unknown = set(names) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown indicator: {', '.join(sorted(unknown))}")
+    p = resolve(params)
+    n = len(close)
+    if n == 0:
+        return {column: np.empty(0) for name in names for column in COLUMNS[name]}
+    if p['macd']['fast'] >= p['macd']['slow']:
+        raise ValueError('MACD fast span must be shorter than the slow span')
+
+    flags = np.array([name in names for name in DEFAULTS], dtype='int64')
+    settings = np.array([p['rsi']['period'], p['macd']['fast'], p['macd']['slow'], p['macd']['signal'],
+                         p['bollinger']['period'], p['bollinger']['width'], p['atr']['period']], dtype='float64')
+    if np.any(settings <= 0):
+        raise ValueError('Indicator periods and spans must be positive')
+    if session_start is None:
+        session_start = np.zeros(n, dtype='bool')
+
+    columns = [np.ascontiguousarray(values, dtype='float64') for values in (high, low, close, volume)]
+    if numba is not None:
+        out = np.full((len(OUTPUTS), n), np.nan)
+        _kernel(*columns, np.ascontiguousarray(session_start, dtype='bool'), flags, settings, out)
+    else:
+        # Indexing Python lists is several times faster than indexing arrays element by element
+        rows = [[math.nan] * n for _ in OUTPUTS]
+        _kernel(*(values.tolist() for values in columns), np.asarray(session_start).tolist(),
+                flags.tolist(), settings.tolist(), rows)
+        out = np.array(rows)
+    return {column: out[OUTPUTS.index(column)] for name in names for column in COLUMNS[name]}
+
+
+def session_starts(index):
+    """True at the first bar of every trading day of a (tz-aware) intraday index."""
+    days = index.normalize().as_unit('s').asi8
+    return np.diff(days, prepend=days[:1] - 1) != 0
+
+
+def _hold(enter, exit):
+    # 1 from every `enter` bar up to the next `exit` bar, 0 elsewhere
+    state = np.where(enter, 1.0, np.where(exit, 0.0, np.nan))
+    last_event = np.where(np.isnan(state), 0, np.arange(len(state)))
+    np.maximum.accumulate(last_event, out=last_event)
+    return np.nan_to_num(state[last_event])
+
+
+def long_flat(source, close, values, params=None):
+    """1 where the `source` indicator's rule is long, 0 where it is flat.
+
+    MACD: above its signal line. RSI: from below `band` until above
+    100 - `band`. Bollinger: from a close under the lower band until one
+    over the upper band. ATR: from a close-to-close rise of more than
+    `multiple` ATRs until an equal fall. VWAP: close above VWAP.
+    """
+    p = resolve(params)[source]
+    with np.errstate(invalid='ignore'):
+        if source == 'macd':
+            return np.where(values['macd'] > values['macd_signal'], 1.0, 0.0)
+        if source == 'rsi':
+            return _hold(values['rsi'] < p['band'], values['rsi'] > 100 - p['band'])
+        if source == 'bollinger':
+            return _hold(close < values['bb_lower'], close > values['bb_upper'])
+        if source == 'atr':
+            move = np.diff(close, prepend=np.nan)
+            threshold = p['multiple'] * np.concatenate([[np.nan], values['atr'][:-1]])
+            return _hold(move > threshold, move < -threshold)
+        if source == 'vwap':
+            return np.where(close > values['vwap'], 1.0, 0.0)
+    raise ValueError(f'Unknown signal source: {source}')
+
+
+def positions(signal):
+    """Crossings of a long/flat series: 1 buy, -1 sell, 0 elsewhere and on the first bar."""
+    position = np.diff(signal, prepend=signal[:1])
+    crossed = np.flatnonzero(position)
+    return position, (position[crossed[-1]] if len(crossed) else None)
+
+
+class IndicatorEngine:
+    """Caches indicator columns per (series key, data version, first bar, length, params)."""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compute(self, key, version, df, names, params=None, intraday=False):
+        """Indicator columns of the OHLCV frame `df`; `key` identifies the series (e.g. ticker and interval)."""
+        names = tuple(sorted(set(names)))
+        resolved = resolve(params)
+        first = int(df.index[0].value) if len(df) else None
+        cache_key = (key, version, first, len(df), names,
+                     tuple((name, tuple(sorted(resolved[name].items()))) for name in names))
+        with self._lock:
+            values = self._entries.get(cache_key)
+            if values is not None:
+                self._entries.move_to_end(cache_key)
+                return values
+
+        values = compute(df['High'], df['Low'], df['Close'], df['Volume'], names, resolved,
+                         session_start=session_starts(df.index) if intraday and len(df) else None)
+        with self._lock:
+            self._entries[cache_key] = values
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return values
+
+    def signal(self, key, version, df, source, params=None, intraday=False):
+        """Indicator columns, crossover positions and last crossing of a non-EMA signal source."""
+        if source not in DEFAULTS:
+            raise ValueError(f'Unknown signal source: {source}')
+        values = self.compute(key, version, df, [source], params, intraday)
+        close = df['Close'].to_numpy(dtype='float64')
+        position, last_position = positions(long_flat(source, close, values, params))
+        return Signal(values, position, last_position)
+
+
+engine = IndicatorEngine()
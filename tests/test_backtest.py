@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest
+import technicals
+
+
+def _daily(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range('2022-01-03', periods=n, tz='America/New_York')
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.015, n))
+    spread = np.abs(rng.normal(0, 0.01, n)) * close
+    return pd.DataFrame({'Open': close, 'High': close + spread, 'Low': close - spread, 'Close': close,
+                         'Volume': rng.integers(1000, 100000, n).astype('float64')}, index=index)
+
+
+def _expected(df, source, params):
+    # The rule on indicator values computed for this cell alone, backtested in pandas
+    values = technicals.compute(df['High'], df['Low'], df['Close'], df['Volume'], [source], {source: params})
+    signal = pd.Series(technicals.long_flat(source, df['Close'].to_numpy(), values, {source: params}), df.index)
+    equity = (1 + signal.shift() * df['Close'].pct_change()).iloc[1:].cumprod()
+    return (round(equity.iloc[-1] - 1, 4), round((equity / equity.cummax() - 1).min(), 4),
+            int((signal.diff().iloc[1:] != 0).sum()))
+
+
+@pytest.mark.parametrize('source, grid', [
+    ('rsi', {'period': [5, 14], 'band': [20, 30, 40]}),
+    ('atr', {'period': [5, 14], 'multiple': [0.5, 1.0, 2.0]}),
+    ('bollinger', {'period': [10, 20], 'width': [1.5, 2.0]}),
+])
+def test_sweep_indicator_matches_each_cell_alone(source, grid):
+    df = _daily()
+    result = backtest.sweep_indicator(df, source, grid)
+    (row_name, rows), (column_name, columns) = grid.items()
+    assert result['rows'] == rows and result['columns'] == columns
+    for i, row in enumerate(rows):
+        for j, column in enumerate(columns):
+            cell = (result['total_return'][i][j], result['max_drawdown'][i][j], result['trades'][i][j])
+            assert cell == pytest.approx(_expected(df, source, {row_name: row, column_name: column}), abs=1e-4)
+
+
+def test_sweep_indicator_leaves_rejected_cells_empty():
+    result = backtest.sweep_indicator(_daily(), 'macd', {'fast': [8, 30], 'slow': [20, 40]})
+    assert result['total_return'][1][0] is None
+    assert None not in (result['total_return'][0][0], result['total_return'][0][1], result['total_return'][1][1])
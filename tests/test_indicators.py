@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import indicators
+
+
+def _closes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2020-01-01', periods=n, freq='B', tz='America/New_York')
+    return pd.Series(100 * np.cumprod(1 + rng.normal(0, 0.02, n)), index=index)
+
+
+def _expected(close, short_window, long_window):
+    # The pandas pipeline update_graph used before the engine
+    short = close.ewm(span=short_window, adjust=True).mean().round(2).to_numpy()
+    long = close.ewm(span=long_window, adjust=True).mean().round(2).to_numpy()
+    signal = np.where(short > long, 1.0, 0.0)
+    position = np.diff(signal, prepend=signal[0])
+    return short, long, position
+
+
+def _assert_matches(crossover, close, short_window=10, long_window=30):
+    short, long, position = _expected(close, short_window, long_window)
+    np.testing.assert_array_equal(crossover.short, short)
+    np.testing.assert_array_equal(crossover.long, long)
+    np.testing.assert_array_equal(crossover.position, position)
+    crossed = np.flatnonzero(position)
+    assert crossover.last_position == (position[crossed[-1]] if len(crossed) else None)
+
+
+@pytest.mark.parametrize('span', [2, 10, 30, 200])
+def test_ema_state_is_bit_identical_to_pandas(span):
+    close = _closes(600)
+    state = indicators.EMAState(span)
+    values = np.concatenate([state.advance(part) for part in np.array_split(close.to_numpy(), 7)])
+    np.testing.assert_array_equal(values, close.ewm(span=span, adjust=True).mean().to_numpy())
+
+
+def test_engine_matches_pandas():
+    close = _closes(500)
+    _assert_matches(indicators.CrossoverEngine().compute('X', close, 10, 30), close)
+
+
+def test_engine_advances_over_new_and_revised_bars():
+    full = _closes(400, seed=1)
+    engine = indicators.CrossoverEngine()
+    for end in (300, 301, 301, 350, 400):
+        close = full.iloc[:end].copy()
+        # The last bar is revised between calls, as a partial bar is
+        close.iloc[-1] *= 1.01 if end % 2 else 0.99
+        _assert_matches(engine.compute('X', close, 10, 30), close)
+    # And the revision settles back to its final value
+    _assert_matches(engine.compute('X', full, 10, 30), full)
+
+
+def test_engine_restarts_when_the_slice_start_moves():
+    full = _closes(400, seed=2)
+    engine = indicators.CrossoverEngine()
+    _assert_matches(engine.compute('X', full.iloc[:300], 10, 30), full.iloc[:300])
+    # A '1y'-style slice a day later: one bar dropped at the start, one added at the end
+    _assert_matches(engine.compute('X', full.iloc[1:301], 10, 30), full.iloc[1:301])
+    assert len(engine._entries) == 3
+
+
+def test_engine_pairs_sharing_a_span_stay_consistent():
+    full = _closes(400, seed=3)
+    engine = indicators.CrossoverEngine()
+    engine.compute('X', full.iloc[:300], 10, 30)
+    # Other pairs move both EMAs of (10, 30) on to another slice
+    engine.compute('X', full.iloc[50:], 10, 50)
+    engine.compute('X', full.iloc[50:], 30, 50)
+    _assert_matches(engine.compute('X', full.iloc[50:], 10, 30), full.iloc[50:])
+
+
+def test_engine_empty_history():
+    # An empty series need not carry a DatetimeIndex
+    crossover = indicators.CrossoverEngine().compute('X', pd.Series([], dtype='float64'), 10, 30)
+    assert len(crossover.short) == 0 and crossover.last_position is None
+
+
+def test_ema_matrix_matches_pandas_with_gaps():
+    closes = np.column_stack([_closes(300, seed=s).to_numpy() for s in range(3)])
+    closes[:40, 1] = np.nan
+    closes[[100, 101, 250], 2] = np.nan
+    out = indicators.ema_matrix(closes, 20)
+    for col in range(3):
+        column = pd.Series(closes[:, col])
+        expected = column.dropna().ewm(span=20, adjust=True).mean().reindex(column.index).ffill()
+        np.testing.assert_array_equal(out[:, col], expected.to_numpy())
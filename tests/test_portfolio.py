@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import portfolio
+
+
+def _returns(n=300, seed=0):
+    # float32 returns with gaps: a late listing, a few missing bars, and a column with almost no data
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0, 0.02, (n, 4)).astype('float32')
+    returns[:40, 1] = np.nan
+    returns[[100, 101, 250], 2] = np.nan
+    returns[5:n - 10, 3] = np.nan
+    return returns
+
+
+def _market(n=300, seed=1):
+    market = np.random.default_rng(seed).normal(0, 0.01, n)
+    market[[7, 150]] = np.nan
+    return market
+
+
+def test_covariance_matches_pandas_with_gaps():
+    returns = _returns()
+    frame = pd.DataFrame(returns.astype('float64'))
+    # Blocks smaller than the column count, so pairs across blocks are covered too
+    cov, corr = portfolio.covariance(returns, min_periods=20, block_size=3)
+    np.testing.assert_allclose(cov, frame.cov(min_periods=20).to_numpy(), rtol=1e-5, atol=1e-10)
+    np.testing.assert_allclose(corr, frame.corr(min_periods=20).to_numpy(), rtol=1e-5, atol=1e-6)
+    # The sparse column has too few rows in common with any other
+    assert np.isnan(cov[3, :3]).all() and np.isnan(corr[:3, 3]).all()
+
+
+def test_rolling_against_matches_pandas_with_gaps():
+    returns, market = _returns(), _market()
+    out = portfolio.rolling_against(returns, market, window=30, min_periods=10, block_size=3)
+    y = pd.Series(market)
+    for col in range(returns.shape[1]):
+        # pandas on the rows where both the column and the market have a value
+        x = pd.Series(returns[:, col].astype('float64'))
+        x, m = x.where(y.notna()), y.where(x.notna())
+        cov = x.rolling(30, min_periods=10).cov(m)
+        expected = {
+            'covariance': cov,
+            'correlation': x.rolling(30, min_periods=10).corr(m),
+            'beta': cov / m.rolling(30, min_periods=10).var(),
+            'volatility': x.rolling(30, min_periods=10).std(),
+        }
+        for name, values in expected.items():
+            np.testing.assert_allclose(getattr(out, name)[:, col], values.to_numpy(), rtol=1e-4, atol=1e-9,
+                                       err_msg=f'{name} of column {col}')
+
+
+def test_rolling_against_min_periods_defaults_to_half_the_window():
+    returns, market = _returns(), _market()
+    out = portfolio.rolling_against(returns, market, window=20)
+    # Column 1 starts at row 40: its first value needs 10 rows in common with the market
+    assert np.isnan(out.beta[:49, 1]).all() and not np.isnan(out.beta[49, 1])
+
+
+def test_rolling_against_rejects_short_windows():
+    with pytest.raises(ValueError):
+        portfolio.rolling_against(_returns(), _market(), window=1)
+
+
+def test_combined_returns_rebalance_over_available_columns():
+    returns = _returns()
+    weights = np.array([1.0, 2.0, 0.5, 1.5])
+    frame = pd.DataFrame(returns.astype('float64'))
+    expected = (frame * weights).sum(axis=1) / (frame.notna() * weights).sum(axis=1)
+    np.testing.assert_allclose(portfolio.combined_returns(returns, weights), expected.to_numpy(), rtol=1e-12)
+    # A row where no holding has a return is NaN, not 0
+    returns[10] = np.nan
+    assert np.isnan(portfolio.combined_returns(returns, weights)[10])
@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import technicals
+
+
+@pytest.fixture(params=['python', 'numba'])
+def kernel(request, monkeypatch):
+    # Run compute() on the plain-Python kernel and, when Numba is installed, on the compiled one
+    if request.param == 'numba':
+        numba = pytest.importorskip('numba')
+        monkeypatch.setattr(technicals, 'numba', numba)
+        monkeypatch.setattr(technicals, '_kernel', numba.njit(technicals._fused))
+    else:
+        monkeypatch.setattr(technicals, 'numba', None)
+        monkeypatch.setattr(technicals, '_kernel', technicals._fused)
+    return request.param
+
+
+def _bars(days=3, per_day=78, seed=0):
+    # 5-minute bars of `days` sessions, with flat stretches so RSI sees zero changes
+    rng = np.random.default_rng(seed)
+    index = pd.DatetimeIndex([
+        stamp for day in pd.bdate_range('2024-03-04', periods=days)
+        for stamp in pd.date_range(day + pd.Timedelta(hours=9, minutes=30), periods=per_day, freq='5min',
+                                   tz='America/New_York')])
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.002, len(index)))
+    close[20:25] = close[19]
+    spread = np.abs(rng.normal(0, 0.003, len(index))) * close
+    return pd.DataFrame({'Open': close, 'High': close + spread, 'Low': close - spread, 'Close': close,
+                         'Volume': rng.integers(100, 10000, len(index)).astype('float64')}, index=index)
+
+
+def _compute(df, name, params=None, session_start=None):
+    return technicals.compute(df['High'], df['Low'], df['Close'], df['Volume'], [name], {name: params or {}},
+                              session_start=session_start)
+
+
+def _wilder(values, period):
+    # Wilder's smoothing seeded with the simple average of the first `period` values
+    seeded = values.iloc[period - 1:].copy()
+    seeded.iloc[0] = values.iloc[:period].mean()
+    return seeded.ewm(alpha=1 / period, adjust=False).mean().reindex(values.index)
+
+
+def _assert_close(actual, expected):
+    np.testing.assert_allclose(actual, expected.to_numpy(), rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize('period', [2, 14])
+def test_rsi_matches_pandas(kernel, period):
+    df = _bars()
+    change = df['Close'].diff().iloc[1:]
+    gain = _wilder(change.clip(lower=0), period)
+    loss = _wilder(-change.clip(upper=0), period)
+    expected = (100 - 100 / (1 + gain / loss)).reindex(df.index)
+    _assert_close(_compute(df, 'rsi', {'period': period})['rsi'], expected)
+
+
+def test_macd_matches_pandas(kernel):
+    df = _bars()
+    macd = (df['Close'].ewm(span=12, adjust=False).mean() - df['Close'].ewm(span=26, adjust=False).mean())
+    signal = macd.ewm(span=9, adjust=False).mean()
+    values = _compute(df, 'macd')
+    _assert_close(values['macd'], macd)
+    _assert_close(values['macd_signal'], signal)
+    _assert_close(values['macd_hist'], macd - signal)
+
+
+def test_bollinger_matches_pandas_population_std(kernel):
+    df = _bars()
+    rolling = df['Close'].rolling(20)
+    mean, std = rolling.mean(), rolling.std(ddof=0)
+    values = _compute(df, 'bollinger', {'width': 2.5})
+    _assert_close(values['bb_mid'], mean)
+    np.testing.assert_allclose(values['bb_upper'], (mean + 2.5 * std).to_numpy(), rtol=1e-7)
+    np.testing.assert_allclose(values['bb_lower'], (mean - 2.5 * std).to_numpy(), rtol=1e-7)
+
+
+def test_atr_matches_pandas(kernel):
+    df = _bars()
+    previous = df['Close'].shift()
+    true_range = pd.concat([df['High'] - df['Low'], (df['High'] - previous).abs(), (df['Low'] - previous).abs()],
+                           axis=1).max(axis=1)
+    _assert_close(_compute(df, 'atr', {'period': 14})['atr'], _wilder(true_range, 14))
+
+
+def test_vwap_restarts_every_session(kernel):
+    df = _bars()
+    session_start = technicals.session_starts(df.index)
+    assert session_start.sum() == 3
+    typical = (df['High'] + df['Low'] + df['Close']) / 3
+    session = session_start.cumsum()
+    expected = ((typical * df['Volume']).groupby(session).cumsum() / df['Volume'].groupby(session).cumsum())
+    _assert_close(_compute(df, 'vwap', session_start=session_start)['vwap'], expected)
+    # Without sessions it accumulates from the first bar
+    _assert_close(_compute(df, 'vwap')['vwap'], (typical * df['Volume']).cumsum() / df['Volume'].cumsum())
+
+
+def test_fused_pass_matches_single_indicators(kernel):
+    df = _bars()
+    session_start = technicals.session_starts(df.index)
+    together = technicals.compute(df['High'], df['Low'], df['Close'], df['Volume'], list(technicals.DEFAULTS),
+                                  session_start=session_start)
+    for name, columns in technicals.COLUMNS.items():
+        alone = _compute(df, name, session_start=session_start)
+        for column in columns:
+            np.testing.assert_array_equal(together[column], alone[column])
+
+
+def test_compute_rejects_bad_parameters():
+    df = _bars(days=1)
+    with pytest.raises(ValueError):
+        _compute(df, 'macd', {'fast': 26, 'slow': 12})
+    with pytest.raises(ValueError):
+        _compute(df, 'rsi', {'period': 0})